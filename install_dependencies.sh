@@ -18,7 +18,7 @@ command_exists() {
 
 # apt install sox libsox-fmt-mp3 mpg123
 sudo apt-get update
-sudo apt-get install -y sox mpg123 libsox-fmt-mp3 python3-dev
+sudo apt-get install -y sox mpg123 libsox-fmt-mp3 python3-dev libasound2-dev
 
 # enable spi
 # kept for compatibility with camera/other SPI peripherals
@@ -0,0 +1,431 @@
+"""Shared microphone capture for the wakeword listener, VAD and recorders.
+
+One capture service reads the input device once and writes 16 kHz mono
+int16 samples into a ring buffer in shared memory. Any number of readers,
+in this process or others, attach by name and keep their own cursor, so
+the device is opened once and readers never copy through pipes.
+
+Shared memory layout: a 64 byte header followed by `capacity` int16
+samples. The header holds a magic string, the sample rate, the capacity,
+the total number of samples ever written (the write position), the
+writer's pid and a heartbeat (the writer's time.monotonic() at its last
+write; CLOCK_MONOTONIC is system-wide on Linux). Samples are written
+before the position is advanced, so a reader only ever sees complete
+data. A reader that falls more than `capacity` behind skips ahead to the
+oldest sample still available and counts an overrun. A reader waiting on
+a writer that exited or stopped writing raises RingWriterGone.
+
+Sources:
+  AlsaSource       - in-process ALSA capture (needs pyalsaaudio)
+  FileSource       - WAV or raw int16 file, optionally paced in real time
+  SharedRingSource - a reader of a running capture service
+
+Examples:
+  python3 audio_capture.py serve --device default
+  python3 audio_capture.py serve --file test.wav --loop
+  python3 audio_capture.py record --seconds 5 question.wav
+  python3 audio_capture.py stream --lookback 0.3 | sox -t raw -r 16000 -e signed -b 16 -c 1 - out.mp3
+  python3 audio_capture.py level --seconds 0.35
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+import wave
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+SAMPLE_RATE = 16000
+DEFAULT_RING_NAME = os.getenv("WHISPLAY_AUDIO_RING", "whisplay-audio")
+DEFAULT_RING_SECONDS = 30
+RING_MAGIC = b"WHSPAUD1"
+HEADER_BYTES = 64
+# A writer that has not written for this long is considered gone
+WRITER_STALL_TIMEOUT = 2.0
+
+
+class RingWriterGone(RuntimeError):
+    """The capture service feeding a ring buffer exited or stopped writing"""
+
+
+# ==================== Sources ====================
+class AlsaSource:
+    """Reads the capture device in-process, one ALSA period per read()"""
+
+    def __init__(self, device="default", rate=SAMPLE_RATE, period_size=1280):
+        if alsaaudio is None:
+            raise RuntimeError("pyalsaaudio is not installed: pip install pyalsaaudio")
+        self.rate = rate
+        self.period_size = period_size
+        self.overruns = 0
+        self._pcm = alsaaudio.PCM(
+            type=alsaaudio.PCM_CAPTURE,
+            mode=alsaaudio.PCM_NORMAL,
+            device=device,
+            channels=1,
+            rate=rate,
+            format=alsaaudio.PCM_FORMAT_S16_LE,
+            periodsize=period_size,
+        )
+
+    def read(self):
+        """Return the next block of int16 samples (blocks for one period)"""
+        while True:
+            length, data = self._pcm.read()
+            if length > 0:
+                return np.frombuffer(data, dtype=np.int16)
+            # Negative length is an overrun (-EPIPE); ALSA has already recovered
+            self.overruns += 1
+
+    def close(self):
+        self._pcm.close()
+
+
+class FileSource:
+    """Plays a 16 kHz mono 16-bit WAV (or raw int16) file as if it were a microphone.
+    read() returns None at the end of the file unless loop is set."""
+
+    def __init__(self, path, rate=SAMPLE_RATE, chunk_samples=1280, realtime=True, loop=False):
+        self.rate = rate
+        self.chunk_samples = chunk_samples
+        self.realtime = realtime
+        self.loop = loop
+        if path.lower().endswith(".wav"):
+            with wave.open(path, "rb") as wav:
+                if wav.getframerate() != rate or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                    raise ValueError(f"{path} must be {rate} Hz mono 16-bit, got {wav.getframerate()} Hz "
+                                     f"{wav.getnchannels()} channel(s) {wav.getsampwidth() * 8}-bit")
+                self.samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        else:
+            self.samples = np.fromfile(path, dtype=np.int16)
+        self.position = 0
+        self._next_time = None
+
+    def read(self):
+        if self.position >= len(self.samples):
+            if not self.loop or not len(self.samples):
+                return None
+            self.position = 0
+        chunk = self.samples[self.position:self.position + self.chunk_samples]
+        self.position += len(chunk)
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_time is None:
+                self._next_time = now
+            self._next_time += len(chunk) / self.rate
+            if self._next_time > now:
+                time.sleep(self._next_time - now)
+        return chunk
+
+    def close(self):
+        pass
+
+
+# ==================== Shared ring buffer ====================
+def _attach_shared_memory(name):
+    """Attach without registering with the resource tracker, which would
+    otherwise unlink the writer's segment when this reader exits"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class AudioRingBuffer:
+    """Single-writer, multi-reader int16 ring buffer in shared memory"""
+
+    def __init__(self, name=DEFAULT_RING_NAME, capacity=None, rate=SAMPLE_RATE, create=False):
+        self.name = name
+        self.created = create
+        if create:
+            capacity = capacity or rate * DEFAULT_RING_SECONDS
+            try:
+                # Left behind by a writer that was killed
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_BYTES + capacity * 2)
+            self._shm.buf[:len(RING_MAGIC)] = RING_MAGIC
+            header = np.ndarray((2,), dtype=np.uint32, buffer=self._shm.buf, offset=8)
+            header[0] = rate
+            header[1] = capacity
+        else:
+            self._shm = _attach_shared_memory(name)
+            if bytes(self._shm.buf[:len(RING_MAGIC)]) != RING_MAGIC:
+                self._shm.close()
+                raise ValueError(f"shared memory {name} is not an audio ring buffer")
+        header = np.ndarray((2,), dtype=np.uint32, buffer=self._shm.buf, offset=8)
+        self.rate = int(header[0])
+        self.capacity = int(header[1])
+        # Total samples written, an aligned 64-bit word so readers never see a torn value
+        self._write_pos = np.ndarray((1,), dtype=np.uint64, buffer=self._shm.buf, offset=16)
+        self._writer_pid = np.ndarray((1,), dtype=np.uint32, buffer=self._shm.buf, offset=24)
+        self._heartbeat = np.ndarray((1,), dtype=np.float64, buffer=self._shm.buf, offset=32)
+        if create:
+            self._writer_pid[0] = os.getpid()
+            self._heartbeat[0] = time.monotonic()
+        self.samples = np.ndarray((self.capacity,), dtype=np.int16, buffer=self._shm.buf, offset=HEADER_BYTES)
+
+    @property
+    def write_position(self):
+        return int(self._write_pos[0])
+
+    def write(self, chunk):
+        """Append samples (writer side only)"""
+        chunk = np.asarray(chunk, dtype=np.int16)
+        if len(chunk) > self.capacity:
+            chunk = chunk[-self.capacity:]
+        position = self.write_position
+        start = position % self.capacity
+        first = min(len(chunk), self.capacity - start)
+        self.samples[start:start + first] = chunk[:first]
+        if first < len(chunk):
+            self.samples[:len(chunk) - first] = chunk[first:]
+        self._write_pos[0] = position + len(chunk)
+        self._heartbeat[0] = time.monotonic()
+
+    def writer_alive(self, stall_timeout=WRITER_STALL_TIMEOUT):
+        """False once the writer closed the ring, exited, or has not written for stall_timeout"""
+        pid = int(self._writer_pid[0])
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return time.monotonic() - float(self._heartbeat[0]) < stall_timeout
+
+    def reader(self, lookback_samples=0):
+        return RingReader(self, lookback_samples)
+
+    def close(self):
+        if self.created:
+            # Tell readers still attached that no more audio is coming
+            self._writer_pid[0] = 0
+        # Drop the numpy views first, SharedMemory.close() refuses while buffers are exported
+        self.samples = None
+        self._write_pos = None
+        self._writer_pid = None
+        self._heartbeat = None
+        self._shm.close()
+        if self.created:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingReader:
+    """A cursor into an AudioRingBuffer. Starts at the current write position,
+    or `lookback_samples` earlier to include audio captured just before attaching."""
+
+    def __init__(self, ring, lookback_samples=0):
+        self.ring = ring
+        self.overruns = 0
+        self.position = max(0, ring.write_position - min(lookback_samples, ring.capacity))
+
+    def available(self):
+        return self.ring.write_position - self.position
+
+    def read(self, max_samples=None):
+        """Return the samples written since the last read (possibly empty).
+        The result is a view into shared memory unless it wraps around the
+        end of the ring; consume it before the writer laps the reader."""
+        write_position = self.ring.write_position
+        if write_position - self.position > self.ring.capacity:
+            self.overruns += 1
+            self.position = write_position - self.ring.capacity
+        count = write_position - self.position
+        if max_samples is not None:
+            count = min(count, max_samples)
+        start = self.position % self.ring.capacity
+        self.position += count
+        if start + count <= self.ring.capacity:
+            return self.ring.samples[start:start + count]
+        return np.concatenate((self.ring.samples[start:], self.ring.samples[:start + count - self.ring.capacity]))
+
+    def wait_read(self, min_samples, timeout=None, poll_interval=0.005):
+        """Block until at least min_samples are available (or timeout), then read them all.
+        Raises RingWriterGone if the writer goes away while waiting."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        next_check = time.monotonic() + 0.5
+        while self.available() < min_samples:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            if now >= next_check:
+                next_check = now + 0.5
+                if not self.ring.writer_alive():
+                    raise RingWriterGone(f"audio ring {self.ring.name} has no writer")
+            time.sleep(poll_interval)
+        return self.read()
+
+
+class SharedRingSource:
+    """Source reading from a capture service started with `audio_capture.py serve`"""
+
+    def __init__(self, name=DEFAULT_RING_NAME, chunk_samples=1280, lookback_samples=0):
+        self.ring = AudioRingBuffer(name)
+        self.rate = self.ring.rate
+        self.chunk_samples = chunk_samples
+        self._reader = self.ring.reader(lookback_samples)
+
+    @property
+    def overruns(self):
+        return self._reader.overruns
+
+    def read(self):
+        """Next block, or None once the capture service has gone away"""
+        try:
+            # Copy out of shared memory: callers may keep the chunk longer than the ring holds it
+            return np.array(self._reader.wait_read(self.chunk_samples))
+        except RingWriterGone as e:
+            print(f"[Audio] {e}", file=sys.stderr)
+            return None
+
+    def close(self):
+        self._reader = None
+        self.ring.close()
+
+
+def open_source(spec=None, chunk_samples=1280):
+    """Create a source from a spec string:
+      "alsa:<device>" (default "alsa:default"), "file:<path>" or "ring:<name>"
+    """
+    spec = spec or "alsa:default"
+    kind, _, target = spec.partition(":")
+    if kind == "alsa":
+        return AlsaSource(target or "default", period_size=chunk_samples)
+    if kind == "file":
+        return FileSource(target, chunk_samples=chunk_samples,
+                          realtime=os.getenv("WHISPLAY_AUDIO_FILE_REALTIME", "true").lower() == "true",
+                          loop=os.getenv("WHISPLAY_AUDIO_FILE_LOOP", "false").lower() == "true")
+    if kind == "ring":
+        return SharedRingSource(target or DEFAULT_RING_NAME, chunk_samples=chunk_samples)
+    raise ValueError(f"unknown audio source: {spec}")
+
+
+# ==================== Capture service ====================
+def serve(args):
+    if args.file:
+        source = FileSource(args.file, chunk_samples=args.period, loop=args.loop)
+    else:
+        source = AlsaSource(args.device, period_size=args.period)
+    ring = AudioRingBuffer(args.name, capacity=int(args.seconds * SAMPLE_RATE), create=True)
+
+    def cleanup(*_):
+        source.close()
+        ring.close()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, cleanup)
+    signal.signal(signal.SIGINT, cleanup)
+    print(f"[Audio] Capturing into shared memory '{args.name}' ({args.seconds:g} s ring)", flush=True)
+    print("[Audio] READY", flush=True)
+    while True:
+        chunk = source.read()
+        if chunk is None:
+            print("[Audio] Source finished", flush=True)
+            cleanup()
+        ring.write(chunk)
+
+
+def record(args):
+    """Example reader: write the next N seconds from the ring to a WAV file"""
+    ring = AudioRingBuffer(args.name)
+    reader = ring.reader(lookback_samples=int(args.lookback * ring.rate))
+    remaining = int(args.seconds * ring.rate)
+    with wave.open(args.output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(ring.rate)
+        while remaining > 0:
+            try:
+                chunk = reader.wait_read(min(remaining, ring.rate // 10), timeout=1)
+            except RingWriterGone as e:
+                sys.exit(f"[Audio] {e}, recording stopped early")
+            chunk = chunk[:remaining]
+            wav.writeframes(chunk.tobytes())
+            remaining -= len(chunk)
+    print(f"[Audio] Wrote {args.output}, overruns: {reader.overruns}")
+    reader = None
+    ring.close()
+
+
+def stream(args):
+    """Write raw 16 kHz int16 PCM from the ring to stdout until killed, e.g. into sox"""
+    ring = AudioRingBuffer(args.name)
+    reader = ring.reader(lookback_samples=int(args.lookback * ring.rate))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, lambda *_: sys.exit(0))
+    out = sys.stdout.buffer
+    try:
+        while True:
+            out.write(reader.wait_read(ring.rate // 50).tobytes())
+            out.flush()
+    except BrokenPipeError:
+        # The consumer (sox) finished; keep the interpreter from complaining on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except RingWriterGone as e:
+        sys.exit(f"[Audio] {e}")
+
+
+def level(args):
+    """Print the RMS amplitude (0-1) of the last N seconds, in sox stat's format"""
+    ring = AudioRingBuffer(args.name)
+    wanted = int(args.seconds * ring.rate)
+    reader = ring.reader(lookback_samples=wanted)
+    try:
+        # Usually already captured; only waits right after the service started
+        samples = reader.wait_read(wanted, timeout=args.seconds + 0.5).astype(np.float32)
+    except RingWriterGone as e:
+        sys.exit(f"[Audio] {e}")
+    rms = float(np.sqrt(np.dot(samples, samples) / len(samples))) / 32768 if len(samples) else 0.0
+    print(f"RMS     amplitude:  {rms:.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared microphone capture service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="capture into the shared ring buffer")
+    serve_parser.add_argument("--device", default=os.getenv("ALSA_INPUT_DEVICE", "default"))
+    serve_parser.add_argument("--file", help="read a 16 kHz mono WAV/raw file instead of the microphone")
+    serve_parser.add_argument("--loop", action="store_true", help="repeat --file forever")
+    serve_parser.add_argument("--period", type=int, default=1280, help="samples per ALSA period")
+    serve_parser.add_argument("--seconds", type=float, default=DEFAULT_RING_SECONDS, help="ring buffer length")
+    serve_parser.add_argument("--name", default=DEFAULT_RING_NAME)
+    record_parser = subparsers.add_parser("record", help="save audio from a running service to WAV")
+    record_parser.add_argument("output")
+    record_parser.add_argument("--seconds", type=float, default=5)
+    record_parser.add_argument("--lookback", type=float, default=0, help="include this many seconds already captured")
+    record_parser.add_argument("--name", default=DEFAULT_RING_NAME)
+    stream_parser = subparsers.add_parser("stream", help="write raw PCM from a running service to stdout")
+    stream_parser.add_argument("--lookback", type=float, default=0, help="start this many seconds in the past")
+    stream_parser.add_argument("--name", default=DEFAULT_RING_NAME)
+    level_parser = subparsers.add_parser("level", help="print the RMS amplitude of the most recent audio")
+    level_parser.add_argument("--seconds", type=float, default=0.35)
+    level_parser.add_argument("--name", default=DEFAULT_RING_NAME)
+    args = parser.parse_args()
+    {"serve": serve, "record": record, "stream": stream, "level": level}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,434 @@
 
 from PIL import Image
 from whisplay import WhisplayBoard
+import os
 import sys
 import time
 import threading
 from utils import ImageUtils
+import numpy as np
 
 try:
   from picamera2 import Picamera2
 except ImportError:
   Picamera2 = None
 
+class LatestFrameSlot:
+    """Single-slot handoff between pipeline stages.
+    put() replaces a frame the next stage has not taken yet (counted as dropped),
+    so a slow stage always works on the newest frame instead of a backlog.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the newest item, or None once closed or after the timeout"""
+        with self._cond:
+            if self._item is None and not self.closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StageTimer:
+    """Accumulates per-stage processing time"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def stats(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "avg_ms": round(self.total / self.count * 1000, 3),
+                "max_ms": round(self.max * 1000, 3)}
+
+
+class MotionDetector:
+    """Frame-difference scene analysis on the preview stream.
+
+    Each frame is subsampled every `step` pixels and reduced to one 8-bit
+    brightness channel (green, which works for both RGB565 and 32-bit frames
+    regardless of channel order). The score is the mean absolute difference
+    to the previous subsampled frame. on_event(name, info) is called with
+      "motion"       - when the score reaches motion_threshold
+      "scene_stable" - once the score stayed below stable_threshold for
+                       stable_ms after motion (or after the preview started)
+    """
+
+    def __init__(self, on_event, motion_threshold=12.0, stable_threshold=4.0, stable_ms=800, step=8):
+        self.on_event = on_event
+        self.motion_threshold = motion_threshold
+        self.stable_threshold = stable_threshold
+        self.stable_time = stable_ms / 1000
+        self.step = step
+        self.state = None
+        self.score = 0.0
+        self._previous = None
+        self._unsettled_since = None
+        self._last_unstable = None
+
+    def _brightness(self, frame, native_rgb565):
+        if native_rgb565:
+            pixels = frame.view(np.uint16) if frame.dtype == np.uint8 else frame
+            green = (pixels[::self.step, ::self.step] >> 5) & 0x3F
+            return (green << 2).astype(np.int16)
+        return frame[::self.step, ::self.step, 1].astype(np.int16)
+
+    def process(self, frame, native_rgb565, timestamp):
+        current = self._brightness(frame, native_rgb565)
+        previous, self._previous = self._previous, current
+        if previous is None or previous.shape != current.shape:
+            self._unsettled_since = self._last_unstable = timestamp
+            return
+        self.score = float(np.abs(current - previous).mean())
+        if self.score >= self.stable_threshold:
+            self._last_unstable = timestamp
+        if self.score >= self.motion_threshold:
+            if self.state != "motion":
+                self.state = "motion"
+                self._unsettled_since = timestamp
+                self.on_event("motion", {"score": round(self.score, 2)})
+        elif self.state != "stable" and timestamp - self._last_unstable >= self.stable_time:
+            self.state = "stable"
+            self.on_event("scene_stable", {
+                "score": round(self.score, 2),
+                "settle_ms": round((timestamp - self._unsettled_since) * 1000),
+            })
+
+
+class CameraStandby:
+    """Owns the Picamera2 instance across camera-mode sessions.
+
+    acquire() opens and configures the camera on first use and starts it;
+    release() stops streaming (the sensor is idle) but keeps the camera open
+    and configured with its buffers allocated, so the next session only has
+    to start() it again instead of opening and reconfiguring the pipeline.
+    After standby_timeout seconds without a session the camera is closed
+    as well (0 = close right away). Entry and exit latencies are kept for
+    stats().
+    """
+
+    def __init__(self, standby_timeout=30):
+        self.standby_timeout = standby_timeout
+        self.picam2 = None
+        self.native_rgb565 = False
+        self.state = "off"
+        self.entry_timer = StageTimer()
+        self.exit_timer = StageTimer()
+        self.first_frame_timer = StageTimer()
+        self.warm_entries = 0
+        self.cold_entries = 0
+        self._release_timer = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def configure_camera(picam2, width, height):
+        """Let the ISP scale to the LCD size and, if it can, pack RGB565 too.
+        The Pi ISP's lores stream is YUV420-only on most models, so the main
+        stream is used at the LCD size instead. Falls back to 32-bit RGB
+        (scaled by the ISP, packed on the CPU) when RGB565 is rejected.
+        Set WHISPLAY_CAMERA_RGB565=false to force the fallback.
+        """
+        if os.getenv("WHISPLAY_CAMERA_RGB565", "true").lower() == "true":
+            try:
+                picam2.configure(picam2.create_preview_configuration(
+                    main={"size": (width, height), "format": "RGB565"}))
+                main = picam2.camera_configuration()["main"]
+                if main["format"] == "RGB565" and tuple(main["size"]) == (width, height):
+                    print("[Camera] ISP outputs RGB565 at LCD size")
+                    return True
+            except Exception as e:
+                print(f"[Camera] RGB565 preview not supported ({e}), converting on the CPU")
+        picam2.configure(picam2.create_preview_configuration(main={"size": (width, height)}))
+        return False
+
+    def acquire(self, width, height):
+        """Return a started camera for a new session"""
+        start_time = time.monotonic()
+        with self._lock:
+            if self._release_timer is not None:
+                self._release_timer.cancel()
+                self._release_timer = None
+            if self.state == "standby":
+                self.warm_entries += 1
+            else:
+                self.cold_entries += 1
+                if self.picam2 is None:
+                    self.picam2 = Picamera2()
+                    self.native_rgb565 = self.configure_camera(self.picam2, width, height)
+            self.picam2.start()
+            self.state = "active"
+        self.entry_timer.add(time.monotonic() - start_time)
+        return self.picam2
+
+    def release(self):
+        """End a session: stop the sensor, keep the configured camera until the standby timeout"""
+        with self._lock:
+            if self.state != "active":
+                return
+            try:
+                self.picam2.stop()
+            except Exception as e:
+                print(f"[Camera] Failed to stop camera: {e}")
+            self.state = "standby"
+            if self.standby_timeout > 0:
+                self._release_timer = threading.Timer(self.standby_timeout, self._power_off)
+                self._release_timer.daemon = True
+                self._release_timer.start()
+        if self.standby_timeout <= 0:
+            self._power_off()
+
+    def prewarm(self, width, height):
+        """Open and configure the camera ahead of the first session"""
+        try:
+            self.acquire(width, height)
+            self.release()
+            print("[Camera] Prewarmed, in standby")
+        except Exception as e:
+            print(f"[Camera] Prewarm failed: {e}")
+
+    def _power_off(self):
+        with self._lock:
+            if self.state != "standby" or self.picam2 is None:
+                return
+            self._release_timer = None
+            self.state = "off"
+            try:
+                self.picam2.close()
+            except Exception as e:
+                print(f"[Camera] Failed to release camera: {e}")
+            # Closing frees the buffers, the next session configures from scratch
+            self.picam2 = None
+            print("[Camera] Released after standby timeout")
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "standby_timeout_s": self.standby_timeout,
+            "warm_entries": self.warm_entries,
+            "cold_entries": self.cold_entries,
+            "entry": self.entry_timer.stats(),
+            "first_frame": self.first_frame_timer.stats(),
+            "exit": self.exit_timer.stats(),
+        }
+
+
+camera_standby = CameraStandby(standby_timeout=float(os.getenv("WHISPLAY_CAMERA_STANDBY_S", "30")))
+
+
 class CameraThread(threading.Thread):
-    
-    picam2 = None
+    """Camera preview as a three-stage pipeline.
+
+    capture (this thread) -> convert -> flush, each on its own thread and
+    connected by LatestFrameSlot, so capturing the next frame, converting
+    the current one and writing the previous one to the LCD overlap. Stages
+    that fall behind drop stale frames instead of queueing them.
+    """
 
-    def __init__(self, whisplay, image_path):
+    def __init__(self, whisplay, image_path, standby=None, motion_detector=None):
         super().__init__()
         self.whisplay = whisplay
-        if CameraThread.picam2 is None:
-            CameraThread.picam2 = Picamera2()
-            CameraThread.picam2.configure(CameraThread.picam2.create_preview_configuration(main={"size": (self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)}))
-        CameraThread.picam2.start()
+        # Optional MotionDetector run on every converted preview frame
+        self.motion_detector = motion_detector
+        self.standby = standby or camera_standby
+        self.created_at = time.monotonic()
+        self.picam2 = self.standby.acquire(self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
+        # True when the ISP delivers little-endian RGB565 at the LCD size
+        self.native_rgb565 = self.standby.native_rgb565
         self.running = False
         self.capture_image = None
         self.image_path = image_path
+        # Take stills at full sensor resolution (mode switch) instead of grabbing a preview frame
+        self.full_resolution_still = os.getenv("WHISPLAY_CAMERA_FULL_RES_STILL", "false").lower() == "true"
+        self.capture_requested = False
+        self._capture_ready = threading.Event()
+        # Set once the capture stage has returned from its last capture_array()
+        self._capture_stage_done = threading.Event()
+        self._capture_thread = None
+        # Preview frame rate cap, set by the UI's frame rate governor (None = as fast as possible)
+        self.max_fps = None
+        self._converted_slot = LatestFrameSlot()
+        self._raw_slot = LatestFrameSlot()
+        self._convert_thread = threading.Thread(target=self._convert_loop, name="CameraConvert", daemon=True)
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="CameraFlush", daemon=True)
+        self.timers = {"capture": StageTimer(), "convert": StageTimer(), "flush": StageTimer(),
+                       "analyze": StageTimer(), "capture_to_flush": StageTimer()}
+        self.frames_flushed = 0
+        self.first_flush_time = None
+        self.last_flush_time = None
         
     def start(self):
         self.running = True
+        self._convert_thread.start()
+        self._flush_thread.start()
         return super().start()
 
     def run(self):
-        while self.running and self.capture_image is None:
-            start_time = time.time()
-            frame = CameraThread.picam2.capture_array()
-            pixel_bytes = ImageUtils.convertCameraFrameToRGB565(frame, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
-            self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, pixel_bytes)
-            end_time = time.time()
-            fps = 1 / (end_time - start_time)
-        # Display the captured image
-        if self.capture_image is not None:
+        """Capture stage"""
+        while self.running and not self.capture_requested:
+            start_time = time.monotonic()
+            frame = self.picam2.capture_array()
+            captured_at = time.monotonic()
+            self.timers["capture"].add(captured_at - start_time)
+            self._raw_slot.put((captured_at, frame))
+            if self.max_fps:
+                time.sleep(max(0, 1 / self.max_fps - (time.monotonic() - start_time)))
+        self._capture_stage_done.set()
+        self._raw_slot.close()
+
+    def _convert_loop(self):
+        while True:
+            item = self._raw_slot.get()
+            if item is None:
+                if self._raw_slot.closed:
+                    break
+                continue
+            captured_at, frame = item
+            start_time = time.monotonic()
+            if self.native_rgb565:
+                # Already packed by the ISP: hand the frame's own buffer to the SPI write
+                pixel_bytes = ImageUtils.rgb565_frame_view(frame, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
+            else:
+                pixel_bytes = ImageUtils.convertCameraFrameToRGB565(frame, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
+            self.timers["convert"].add(time.monotonic() - start_time)
+            self._converted_slot.put((captured_at, pixel_bytes))
+            if self.motion_detector is not None:
+                # After the handoff, so analysis overlaps the LCD flush instead of delaying it
+                start_time = time.monotonic()
+                try:
+                    self.motion_detector.process(frame, self.native_rgb565, captured_at)
+                except Exception as e:
+                    print(f"[Camera] Motion analysis failed: {e}")
+                    self.motion_detector = None
+                self.timers["analyze"].add(time.monotonic() - start_time)
+        self._converted_slot.close()
+
+    def _flush_loop(self):
+        while True:
+            item = self._converted_slot.get()
+            if item is None:
+                if self._converted_slot.closed:
+                    break
+                continue
+            captured_at, pixel_bytes = item
+            start_time = time.monotonic()
+            if self.native_rgb565:
+                # ISP RGB565 is little-endian, let the controller swap the bytes. The byte
+                # order is switched back under the same lock, so a UI draw from another
+                # thread never goes out with the camera's endianness.
+                with self.whisplay.spi_lock:
+                    self.whisplay.set_pixel_byte_order(True)
+                    try:
+                        self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, pixel_bytes)
+                    finally:
+                        self.whisplay.set_pixel_byte_order(False)
+            else:
+                self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, pixel_bytes)
+            end_time = time.monotonic()
+            self.timers["flush"].add(end_time - start_time)
+            self.timers["capture_to_flush"].add(end_time - captured_at)
+            self.frames_flushed += 1
+            if self.first_flush_time is None:
+                self.first_flush_time = end_time
+                self.standby.first_frame_timer.add(end_time - self.created_at)
+            self.last_flush_time = end_time
+        # Display the captured image once the capture worker has it
+        if self.capture_requested and self._capture_ready.wait(timeout=10) and self.capture_image is not None:
             pixel_bytes = ImageUtils.image_to_rgb565(self.capture_image, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
             self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, pixel_bytes)
-        time.sleep(2)  # Display for 2 seconds
+
+    def stats(self):
+        """Preview fps, per-stage latency and frames dropped between stages"""
+        fps = 0
+        if self.frames_flushed > 1 and self.last_flush_time > self.first_flush_time:
+            fps = round((self.frames_flushed - 1) / (self.last_flush_time - self.first_flush_time), 2)
+        return {
+            "fps": fps,
+            "frames": self.frames_flushed,
+            "native_rgb565": self.native_rgb565,
+            "dropped_before_convert": self._raw_slot.dropped,
+            "dropped_before_flush": self._converted_slot.dropped,
+            "stages": {name: timer.stats() for name, timer in self.timers.items()},
+        }
                 
-    def capture(self):
-        frame = CameraThread.picam2.capture_array()
-        self.capture_image = Image.fromarray(frame)
-        # convert to RGB to avoid errors when saving as JPEG (JPEG does not support alpha)
-        if self.capture_image.mode != "RGB":
-            self.capture_image = self.capture_image.convert("RGB")
-        # save to file
-        self.capture_image.save(self.image_path, format="JPEG", quality=95)
-        print(f"[Camera] Captured image saved to {self.image_path}")
+    def capture(self, on_saved=None):
+        """Request a still and return; grabbing it (after the preview stops),
+        the full resolution mode switch, if enabled, and JPEG encoding happen
+        on a worker thread. on_saved(path) is called from that worker once the
+        file is written."""
+        if self.capture_requested:
+            return  # one still per camera session
+        self.capture_requested = True
+        self._capture_thread = threading.Thread(target=self._capture_worker, args=(on_saved,),
+                                                name="CameraCapture", daemon=True)
+        self._capture_thread.start()
+
+    def _capture_worker(self, on_saved):
+        try:
+            if self.ident is not None:
+                # The capture stage may still be inside capture_array() on the same Picamera2
+                self._capture_stage_done.wait()
+            frame = None
+            if not self.full_resolution_still:
+                frame = self.picam2.capture_array()
+            if frame is None:
+                # Briefly switches the sensor to its full resolution still mode, then back to preview
+                frame = self.picam2.switch_mode_and_capture_array(
+                    self.picam2.create_still_configuration(), "main")
+            elif self.native_rgb565:
+                frame = ImageUtils.rgb565_frame_to_rgb888(frame, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
+            image = Image.fromarray(frame)
+            # convert to RGB to avoid errors when saving as JPEG (JPEG does not support alpha)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            self.capture_image = image
+            self._capture_ready.set()
+            # save to file, renamed into place so readers never see a partial JPEG
+            temp_path = self.image_path + ".tmp"
+            image.save(temp_path, format="JPEG", quality=95)
+            os.replace(temp_path, self.image_path)
+            print(f"[Camera] Captured image {image.width}x{image.height} saved to {self.image_path}")
+        except Exception as e:
+            print(f"[Camera] Capture failed: {e}")
+            self._capture_ready.set()
+            return
+        if on_saved is not None:
+            on_saved(self.image_path)
 
     def stop(self):
+        stop_time = time.monotonic()
         self.running = False
-        self.picam2.stop()
+        if self._capture_thread is not None:
+            # Never release the sensor in the middle of a still capture
+            self._capture_thread.join()
         self.join()
+        self._convert_thread.join()
+        self._flush_thread.join()
+        self.standby.release()
+        self.standby.exit_timer.add(time.monotonic() - stop_time)
 
 
 if __name__ == "__main__":
@@ -3,14 +3,20 @@ import os
 import time
 import socket
 import json
+import select
 import sys
 import threading
 import signal
+import itertools
+import glob
+from collections import deque
 
 # from whisplay import WhisplayBoard
-from whisplay import WhisplayBoard
-from camera import CameraThread
+from whisplay import WhisplayBoard, NullWhisplayBoard
+from camera import CameraThread, MotionDetector, camera_standby
 from utils import ColorUtils, ImageUtils, TextUtils
+from protocol import AckPolicy, ClientConnection, LatencyTracer, LineFramer, SessionRecorder, decode_message
+from gestures import ButtonGestureRecognizer
 
 STATUS_ICON_DIR = os.path.join(os.path.dirname(__file__), "status-bar-icon")
 if STATUS_ICON_DIR not in sys.path:
@@ -31,6 +37,10 @@ battery_font_size=13
 current_status = "Hello"
 current_emoji = "😄"
 current_text = "Waiting for message..."
+# Bumped whenever current_text is replaced by something that is not a continuation
+current_text_generation = 0
+# Bumped on every display state change, used to match transactions to flushed frames
+display_state_serial = 0
 current_battery_level = 100
 current_battery_color = ColorUtils.get_rgb255_from_any("#55FF00")
 current_scroll_top = 0
@@ -40,23 +50,114 @@ current_image = None
 current_network_connected = None
 current_rag_icon_visible = False
 camera_mode = False
-camera_mode_button_press_time = 0
-camera_mode_button_release_time = 0
 camera_capture_image_path = ""
 camera_thread = None
+# Guards swapping camera_thread; exits can come from a capture timer and a long press at once
+camera_lock = threading.Lock()
 clients = {}
+clients_lock = threading.Lock()
+outbound_queue_size = int(os.getenv("WHISPLAY_OUTBOUND_QUEUE_SIZE", "64"))
+outbound_policy = os.getenv("WHISPLAY_OUTBOUND_POLICY", "drop_oldest")
 status_icon_factories = []
+display_state_lock = threading.RLock()
+latency_tracer = LatencyTracer()
+render_thread = None
+# Optional recorder of every inbound line, enabled with WHISPLAY_TRACE_FILE
+session_recorder = None
+connection_ids = itertools.count(1)
+# Turns button edges into click / double_click / long_press events
+gesture_recognizer = None
+# Dims / sleeps the display when idle, created in __main__
+display_power = None
 
 
 def register_status_icon_factory(factory, priority=100):
     status_icon_factories.append({"priority": priority, "factory": factory})
 
+class FrameRateGovernor:
+    """Picks the render frame rate for the current conditions.
+
+    active_fps while text scrolls, the camera preview runs or a message or
+    button press happened within the last active_hold seconds, static_fps
+    otherwise. Both are capped at throttled_fps while the hottest
+    /sys/class/thermal zone is at or above thermal_limit_c (released 5 degrees
+    below it) or the battery level is at or below low_battery_level.
+    """
+
+    THERMAL_ZONE_GLOB = "/sys/class/thermal/thermal_zone*/temp"
+
+    def __init__(self, active_fps=30, static_fps=5, throttled_fps=15, thermal_limit_c=70,
+                 low_battery_level=20, active_hold=1.0, thermal_poll_interval=5.0):
+        self.active_fps = active_fps
+        self.static_fps = static_fps
+        self.throttled_fps = throttled_fps
+        self.thermal_limit_c = thermal_limit_c
+        self.low_battery_level = low_battery_level
+        self.active_hold = active_hold
+        self.thermal_poll_interval = thermal_poll_interval
+        self.thermal_zones = glob.glob(self.THERMAL_ZONE_GLOB)
+        self.soc_temp_c = None
+        self.thermal_throttled = False
+        self.fps = active_fps
+        self.reason = "active"
+        self._next_thermal_poll = 0.0
+
+    def read_soc_temp(self):
+        """Hottest thermal zone in degrees Celsius, None if none can be read"""
+        temps = []
+        for zone in self.thermal_zones:
+            try:
+                with open(zone, "r") as f:
+                    temps.append(int(f.read().strip()) / 1000)
+            except (OSError, ValueError):
+                pass
+        return max(temps) if temps else None
+
+    def update(self, now, last_activity, last_motion):
+        if self.thermal_zones and now >= self._next_thermal_poll:
+            self._next_thermal_poll = now + self.thermal_poll_interval
+            self.soc_temp_c = self.read_soc_temp()
+            if self.soc_temp_c is not None:
+                if self.soc_temp_c >= self.thermal_limit_c:
+                    self.thermal_throttled = True
+                elif self.soc_temp_c < self.thermal_limit_c - 5:
+                    self.thermal_throttled = False
+
+        if camera_mode:
+            fps, reason = self.active_fps, "camera"
+        elif now - max(last_activity, last_motion) < self.active_hold:
+            fps, reason = self.active_fps, "active"
+        else:
+            fps, reason = self.static_fps, "static"
+        if fps > self.throttled_fps:
+            if self.thermal_throttled:
+                fps, reason = self.throttled_fps, f"{reason}, thermal"
+            elif current_battery_level is not None and current_battery_level <= self.low_battery_level:
+                fps, reason = self.throttled_fps, f"{reason}, low battery"
+        if reason != self.reason:
+            print(f"[Render] {fps} fps ({reason})")
+        self.fps = fps
+        self.reason = reason
+        if camera_thread is not None:
+            camera_thread.max_fps = fps
+        return fps
+
+    def stats(self):
+        return {"fps": self.fps, "reason": self.reason, "soc_temp_c": self.soc_temp_c}
+
+
 class RenderThread(threading.Thread):
-    def __init__(self, whisplay, font_path, fps=30):
+    # scroll_speed is in pixels per frame at this frame rate, scrolling itself is time based
+    SCROLL_REFERENCE_FPS = 30
+
+    def __init__(self, whisplay, font_path, fps=30, governor=None):
         super().__init__()
         self.whisplay = whisplay
         self.font_path = font_path
         self.fps = fps
+        self.governor = governor or FrameRateGovernor(active_fps=fps)
+        self.last_scroll_time = None
+        self.scroll_remainder = 0.0
         self.render_init_screen()
         # Clear logo after 1 second and start running loop
         time.sleep(1)
@@ -65,6 +166,20 @@ class RenderThread(threading.Thread):
         self.main_text_line_height = self.main_text_font.getmetrics()[0] + self.main_text_font.getmetrics()[1]
         self.text_cache_image = None
         self.current_render_text = ""
+        # Wrapped lines of the text laid out so far, extended incrementally on append
+        self.layout_lines = []
+        self.layout_text_length = 0
+        self.layout_generation = -1
+        # Render statistics, reported by {"stats": true}
+        self.frame_count = 0
+        self.frame_time_total = 0.0
+        self.frame_time_max = 0.0
+        self.recent_frame_times = deque(maxlen=2048)
+        # Last pixels sent per screen region, redrawn when the panel wakes up
+        self.frame_regions = {}
+        # Last time the frame content moved on its own (scrolling), counts as activity
+        self.last_motion_time = time.monotonic()
+        self.last_render_error = None
 
     def render_init_screen(self):
         # Display logo on startup
@@ -76,15 +191,16 @@ class RenderThread(threading.Thread):
             whisplay.set_backlight(100)
             whisplay.draw_image(0, 0, whisplay.LCD_WIDTH, whisplay.LCD_HEIGHT, rgb565_data)
 
-    def render_frame(self, status, emoji, text, scroll_top, battery_level, battery_color):
+    def render_frame(self, status, emoji, text, scroll_top, battery_level, battery_color, text_generation=0):
+        """Render one frame to the LCD, returns False if nothing was flushed"""
         global current_scroll_speed, current_image_path, current_image, camera_mode
         if camera_mode:
-            return  # Skip rendering if in camera mode
+            return False  # Skip rendering if in camera mode
         if current_image_path not in [None, ""]:
             # Try to load image from path
             if current_image is not None:
                 rgb565_data = ImageUtils.image_to_rgb565(current_image, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
-                self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, rgb565_data)
+                self.draw_region(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, rgb565_data)
             elif os.path.exists(current_image_path):
                 try:
                     image = Image.open(current_image_path).convert("RGBA") # 1024x1024
@@ -105,7 +221,7 @@ class RenderThread(threading.Thread):
                     image = image.resize((self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT), Image.LANCZOS)
                     current_image = image
                     rgb565_data = ImageUtils.image_to_rgb565(image, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT)
-                    self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, rgb565_data)
+                    self.draw_region(0, 0, self.whisplay.LCD_WIDTH, self.whisplay.LCD_HEIGHT, rgb565_data)
                 except Exception as e:
                     print(f"[Render] Failed to load image {current_image_path}: {e}")
         else:
@@ -123,40 +239,55 @@ class RenderThread(threading.Thread):
             
             # render header
             self.render_header(image, draw, status, emoji, battery_level, battery_color)
-            self.whisplay.draw_image(0, 0, self.whisplay.LCD_WIDTH, header_height, ImageUtils.image_to_rgb565(image, self.whisplay.LCD_WIDTH, header_height))
+            self.draw_region(0, 0, self.whisplay.LCD_WIDTH, header_height, ImageUtils.image_to_rgb565(image, self.whisplay.LCD_WIDTH, header_height))
 
             # render main text area
             text_area_height = self.whisplay.LCD_HEIGHT - header_height
             text_bg_image = Image.new("RGBA", (self.whisplay.LCD_WIDTH, text_area_height), (0, 0, 0, 255))
             text_draw = ImageDraw.Draw(text_bg_image)
-            self.render_main_text(text_bg_image, text_area_height, text_draw, text, current_scroll_speed)
-            self.whisplay.draw_image(0, header_height, self.whisplay.LCD_WIDTH, text_area_height, ImageUtils.image_to_rgb565(text_bg_image, self.whisplay.LCD_WIDTH, text_area_height))
-
-        
-
-    def render_main_text(self, main_text_image, area_height, draw, text, scroll_speed=2):
+            self.render_main_text(text_bg_image, text_area_height, text_draw, text, current_scroll_speed, text_generation)
+            self.draw_region(0, header_height, self.whisplay.LCD_WIDTH, text_area_height, ImageUtils.image_to_rgb565(text_bg_image, self.whisplay.LCD_WIDTH, text_area_height))
+        return True
+
+    def draw_region(self, x, y, width, height, rgb565_data):
+        self.whisplay.draw_image(x, y, width, height, rgb565_data)
+        self.frame_regions[(x, y, width, height)] = rgb565_data
+
+    def redraw_cached_frame(self):
+        for (x, y, width, height), rgb565_data in self.frame_regions.items():
+            self.whisplay.draw_image(x, y, width, height, rgb565_data)
+
+    def layout_text(self, draw, text, font, max_width, text_generation):
+        """Wrap text into lines, only re-wrapping the appended part when the text is a continuation"""
+        if text_generation != self.layout_generation or len(text) < self.layout_text_length:
+            self.layout_lines = TextUtils.wrap_text(draw, text, font, max_width)
+        elif len(text) > self.layout_text_length:
+            # The last line may still grow, so wrap again starting from its first character
+            last_line = self.layout_lines.pop() if self.layout_lines else ""
+            start = self.layout_text_length - len(last_line)
+            self.layout_lines.extend(TextUtils.wrap_text(draw, text[start:], font, max_width))
+        self.layout_text_length = len(text)
+        self.layout_generation = text_generation
+        return self.layout_lines
+
+    def render_main_text(self, main_text_image, area_height, draw, text, scroll_speed=2, text_generation=0):
         global current_scroll_top
         """Render main text content, wrap lines according to screen width, only display currently visible part"""
         if not text:
             return
         # Use main text font
         font = ImageFont.truetype(self.font_path, 20)
-        lines = TextUtils.wrap_text(draw, text, font, self.whisplay.LCD_WIDTH - 20)
+        lines = self.layout_text(draw, text, font, self.whisplay.LCD_WIDTH - 20, text_generation)
 
         # Line height
         line_height = self.main_text_line_height
 
         # Calculate currently visible lines
-        display_lines = []
-        render_y = 0
-        fin_show_lines = False
-        for i, line in enumerate(lines):
-            if (i + 1) * line_height >= current_scroll_top and i * line_height - current_scroll_top <= area_height:
-                display_lines.append(line)
-                fin_show_lines = True
-            elif fin_show_lines is False:
-                render_y += line_height
-        
+        first_line = max(0, -(-current_scroll_top // line_height) - 1)
+        last_line = (current_scroll_top + area_height) // line_height
+        display_lines = lines[first_line:last_line + 1]
+        render_y = first_line * line_height
+
         # render_text
         render_text = ""
         for line in display_lines:
@@ -173,9 +304,19 @@ class RenderThread(threading.Thread):
         # Draw text_cache_image to main_text_image
         main_text_image.paste(self.text_cache_image, (0, -current_scroll_top), self.text_cache_image)
 
-        # Update scroll position
+        # Update scroll position from the elapsed time, so the speed does not depend on the frame rate
+        now = time.monotonic()
+        elapsed = min(0.25, now - self.last_scroll_time) if self.last_scroll_time is not None else 0
+        self.last_scroll_time = now
         if scroll_speed > 0 and current_scroll_top < (len(lines) + 1) * line_height - area_height:
-            current_scroll_top += scroll_speed
+            self.scroll_remainder += scroll_speed * self.SCROLL_REFERENCE_FPS * elapsed
+            step = int(self.scroll_remainder)
+            if step:
+                self.scroll_remainder -= step
+                current_scroll_top += step
+            self.last_motion_time = now
+        else:
+            self.scroll_remainder = 0.0
                 
 
     def render_header(self, image, draw, status, emoji, battery_level, battery_color):
@@ -194,14 +335,14 @@ class RenderThread(threading.Thread):
         top_height = status_font_size + emoji_font_size + 20
 
         # Draw status centered
-        status_bbox = status_font.getbbox(current_status)
+        status_bbox = status_font.getbbox(status)
         status_w = status_bbox[2] - status_bbox[0]
-        TextUtils.draw_mixed_text(draw, image, current_status, status_font, (whisplay.CornerHeight, 0))
+        TextUtils.draw_mixed_text(draw, image, status, status_font, (whisplay.CornerHeight, 0))
 
         # Draw emoji centered
-        emoji_bbox = emoji_font.getbbox(current_emoji)
+        emoji_bbox = emoji_font.getbbox(emoji)
         emoji_w = emoji_bbox[2] - emoji_bbox[0]
-        TextUtils.draw_mixed_text(draw, image, current_emoji, emoji_font, ((image_width - emoji_w) // 2, status_font_size + 8))
+        TextUtils.draw_mixed_text(draw, image, emoji, emoji_font, ((image_width - emoji_w) // 2, status_font_size + 8))
         
         # Draw battery icon
         status_icon_context = {
@@ -251,24 +392,191 @@ class RenderThread(threading.Thread):
             cursor_x = icon_x - icon_gap
 
     def run(self):
-        frame_interval = 1 / self.fps
         while self.running:
-            self.render_frame(current_status, current_emoji, current_text, current_scroll_top, current_battery_level, current_battery_color)
-            time.sleep(frame_interval)
+            if not display_power.before_frame(self):
+                # Idle: no rendering and no SPI traffic until activity or the next power state change
+                display_power.wait()
+                self.last_scroll_time = None
+                continue
+            fps = self.governor.update(time.monotonic(), display_power.last_activity, self.last_motion_time)
+            # Snapshot under the lock so a batched update is never rendered half-applied
+            with display_state_lock:
+                frame_state = (current_status, current_emoji, current_text, current_scroll_top,
+                               current_battery_level, current_battery_color, current_text_generation)
+                frame_serial = display_state_serial
+            frame_start = time.monotonic()
+            try:
+                flushed = self.render_frame(*frame_state)
+            except Exception as e:
+                # One bad frame must not end the render thread and freeze the display
+                if str(e) != self.last_render_error:
+                    print(f"[Render] Frame failed: {e}")
+                self.last_render_error = str(e)
+                flushed = False
+            if flushed:
+                frame_end = time.monotonic()
+                latency_tracer.frame_flushed(frame_serial, frame_end)
+                self.frame_count += 1
+                self.frame_time_total += frame_end - frame_start
+                self.frame_time_max = max(self.frame_time_max, frame_end - frame_start)
+                self.recent_frame_times.append(frame_end - frame_start)
+            frame_deadline = frame_start + 1 / fps
+            while self.running:
+                now = time.monotonic()
+                if now >= frame_deadline:
+                    break
+                if display_power.wait(frame_deadline - now):
+                    # Activity: render sooner on a slow static screen, but never above the active rate
+                    frame_deadline = min(frame_deadline, frame_start + 1 / self.governor.active_fps)
             
     def stop(self):
         self.running = False
+        display_power.activity()
+
+    def stats(self):
+        recent = sorted(self.recent_frame_times)
+        def recent_percentile(pct):
+            if not recent:
+                return 0
+            return round(recent[min(len(recent) - 1, int(len(recent) * pct / 100))] * 1000, 3)
+        return {
+            "frames": self.frame_count,
+            "avg_frame_ms": round(self.frame_time_total / self.frame_count * 1000, 3) if self.frame_count else 0,
+            "max_frame_ms": round(self.frame_time_max * 1000, 3),
+            "p50_frame_ms": recent_percentile(50),
+            "p95_frame_ms": recent_percentile(95),
+            "p99_frame_ms": recent_percentile(99),
+        }
+
+class DisplayPowerManager:
+    """Idle policy for the display.
+
+    States: "active" (rendering), "dimmed" (backlight at idle_brightness,
+    render loop paused so no SPI traffic) and "asleep" (backlight off, and
+    with panel_sleep the ST7789 is put into sleep-in). activity() is called
+    on every socket message and button press; the render thread does the
+    actual transitions in before_frame() so all SPI traffic stays on it.
+    """
+
+    def __init__(self, whisplay, idle_timeout=60, sleep_timeout=300, idle_brightness=10, panel_sleep=False):
+        self.whisplay = whisplay
+        self.idle_timeout = idle_timeout
+        self.sleep_timeout = sleep_timeout
+        self.idle_brightness = idle_brightness
+        self.panel_sleep = panel_sleep
+        self.brightness = 100
+        self.state = "active"
+        self.state_since = time.monotonic()
+        self.last_activity = self.state_since
+        self.state_time = {"active": 0.0, "dimmed": 0.0, "asleep": 0.0}
+        self.wake_count = 0
+        self._timeout = None
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+
+    def activity(self):
+        with self._lock:
+            self.last_activity = time.monotonic()
+        self._wake_event.set()
+
+    def set_brightness(self, brightness):
+        with self._lock:
+            self.brightness = brightness
+            if self.state == "active":
+                self.whisplay.set_backlight(brightness)
+        self.activity()
+
+    def wait(self, timeout=None):
+        """Sleep until the given timeout, the next idle transition or activity.
+        Returns True if woken by activity."""
+        if timeout is None:
+            timeout = self._timeout
+        woken = self._wake_event.wait(timeout)
+        self._wake_event.clear()
+        return woken
+
+    def _set_state_locked(self, state, now):
+        self.state_time[self.state] += now - self.state_since
+        print(f"[Power] {self.state} -> {state}")
+        self.state = state
+        self.state_since = now
+
+    def before_frame(self, renderer):
+        """Called by the render thread before each frame, returns False while idle"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state != "active":
+                if self.last_activity > self.state_since:
+                    self._wake_locked(renderer, now)
+                    return True
+                idle_for = now - self.state_since
+                if self.state == "dimmed" and self.sleep_timeout:
+                    if idle_for >= self.sleep_timeout:
+                        self._sleep_locked(now)
+                        self._timeout = None
+                    else:
+                        self._timeout = self.sleep_timeout - idle_for
+                else:
+                    self._timeout = None
+                return False
+            if camera_mode or not self.idle_timeout:
+                return True
+            idle_for = now - max(self.last_activity, renderer.last_motion_time)
+            if idle_for < self.idle_timeout:
+                return True
+            self.whisplay.set_backlight(self.idle_brightness)
+            self._set_state_locked("dimmed", now)
+            self._timeout = self.sleep_timeout or None
+            return False
+
+    def _sleep_locked(self, now):
+        self.whisplay.set_backlight(0)
+        if self.panel_sleep:
+            self.whisplay.sleep_panel()
+        self._set_state_locked("asleep", now)
+
+    def _wake_locked(self, renderer, now):
+        # Under the board's SPI lock so no camera flush lands between sleep-out and the redraw
+        with self.whisplay.spi_lock:
+            if self.whisplay.panel_sleeping:
+                self.whisplay.wake_panel()
+                # Frame memory survives sleep-in, but redraw it in case the panel lost it
+                renderer.redraw_cached_frame()
+        self.whisplay.set_backlight(self.brightness)
+        self.wake_count += 1
+        self._set_state_locked("active", now)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            state_time = dict(self.state_time)
+            state_time[self.state] += now - self.state_since
+            return {
+                "state": self.state,
+                "wakes": self.wake_count,
+                "seconds_in_state": {state: round(seconds, 3) for state, seconds in state_time.items()},
+            }
 
 def update_display_data(status=None, emoji=None, text=None,
                   scroll_speed=None, battery_level=None, battery_color=None, image_path=None,
-                  network_connected=None, rag_icon_visible=None):
+                  network_connected=None, rag_icon_visible=None, text_append=None):
+    with display_state_lock:
+        _update_display_data(status, emoji, text, scroll_speed, battery_level, battery_color,
+                             image_path, network_connected, rag_icon_visible, text_append)
+
+def _update_display_data(status, emoji, text, scroll_speed, battery_level, battery_color,
+                         image_path, network_connected, rag_icon_visible, text_append):
     global current_status, current_emoji, current_text, current_battery_level
     global current_battery_color, current_scroll_top, current_scroll_speed, current_image_path
-    global current_network_connected, current_rag_icon_visible
+    global current_network_connected, current_rag_icon_visible, current_text_generation
+    global display_state_serial
+
+    display_state_serial += 1
 
     # If text is not continuation of previous, reset scroll position
     if text is not None and not text.startswith(current_text):
         current_scroll_top = 0
+        current_text_generation += 1
         TextUtils.clean_line_image_cache()
     if scroll_speed is not None:
         current_scroll_speed = scroll_speed
@@ -279,49 +587,75 @@ def update_display_data(status=None, emoji=None, text=None,
     current_status = status if status is not None else current_status
     current_emoji = emoji if emoji is not None else current_emoji
     current_text = text if text is not None else current_text
+    if text_append:
+        # Streaming continuation: only the delta travels over the socket and gets laid out
+        current_text += text_append
     current_battery_level = battery_level if battery_level is not None else current_battery_level
     current_battery_color = battery_color if battery_color is not None else current_battery_color
     current_image_path = image_path if image_path is not None else current_image_path
 
 
 def send_to_all_clients(message):
-    """Send message to all connected clients"""
+    """Queue message for all connected clients, never blocks on a slow client"""
     message_json = json.dumps(message).encode("utf-8") + b"\n"
-    for addr, client_socket in clients.items():
-        try:
-            client_socket.sendall(message_json)
-            # Use ellipsis for long messages
-            if len(message_json) > 100:
-                display_message = message_json[:50] + b"..." + message_json[-50:]
-            else:
-                display_message = message_json
-            print(f"[Server] Sent notification to client {addr}: {display_message}")
-        except Exception as e:
-            print(f"[Server] Failed to send notification to client {addr}: {e}")
+    # Use ellipsis for long messages
+    if len(message_json) > 100:
+        display_message = message_json[:50] + b"..." + message_json[-50:]
+    else:
+        display_message = message_json
+    with clients_lock:
+        connections = list(clients.values())
+    for connection in connections:
+        if connection.enqueue(message_json, droppable=True):
+            print(f"[Server] Queued notification to client {connection.addr}: {display_message}")
+        else:
+            print(f"[Server] Failed to queue notification to client {connection.addr}")
+
+def get_server_stats():
+    with clients_lock:
+        connections = list(clients.values())
+    client_stats = {f"{c.addr[0]}:{c.addr[1]}": c.stats() for c in connections}
+    camera = camera_thread
+    return {
+        "time": time.monotonic(),
+        "clients": client_stats,
+        "events_queued": sum(item["queued"] for item in client_stats.values()),
+        "events_dropped": sum(item["dropped"] for item in client_stats.values()),
+        "render": render_thread.stats() if render_thread is not None else None,
+        "spi": render_thread.whisplay.get_spi_stats() if render_thread is not None else None,
+        "soft_pwm": render_thread.whisplay.get_soft_pwm_stats() if render_thread is not None else None,
+        "power": display_power.stats() if display_power is not None else None,
+        "governor": render_thread.governor.stats() if render_thread is not None else None,
+        "camera": camera.stats() if camera is not None else None,
+        "camera_standby": camera_standby.stats(),
+    }
 
 def exit_camera_mode():
     global camera_mode, camera_thread
     print("[Camera] Exiting camera mode...")
-    if camera_thread is not None:
-        camera_thread.stop()
-        camera_thread = None
+    with camera_lock:
+        thread, camera_thread = camera_thread, None
+    if thread is not None:
+        thread.stop()
     notification = {"event": "exit_camera_mode"}
     send_to_all_clients(notification)
     camera_mode = False
 
-def check_is_released():
-    global camera_mode, camera_mode_button_press_time, camera_mode_button_release_time, camera_thread
-    if camera_mode and camera_mode_button_release_time < camera_mode_button_press_time:
-        # long press detected, exit camera mode
-        print("[Camera] Exiting camera mode due to long press...")
-        exit_camera_mode()
+def on_button_gesture(gesture, info):
+    """Called by the gesture recognizer once a gesture has been decided"""
+    if camera_mode:
+        if gesture == "long_press":
+            print("[Camera] Exiting camera mode due to long press...")
+            exit_camera_mode()
+        return  # Other gestures are not used in camera mode
+    print(f"[Server] Button {gesture}")
+    notification = {"event": gesture, **info}
+    send_to_all_clients(notification)
 
 def on_button_pressed():
-    global camera_mode, camera_mode_button_press_time, camera_mode_button_release_time
+    display_power.activity()
+    gesture_recognizer.press(whisplay.last_button_event_time)
     if camera_mode:
-        camera_mode_button_press_time = time.time()
-        # check after 2 seconds, exit camera mode if not released
-        threading.Timer(2.0, check_is_released).start()
         return
     """Function executed when button is pressed"""
     print("[Server] Button pressed")
@@ -329,19 +663,15 @@ def on_button_pressed():
     send_to_all_clients(notification)
 
 def on_button_release():
-    global camera_mode, camera_mode_button_press_time, camera_mode_button_release_time
+    gesture_recognizer.release(whisplay.last_button_event_time)
     if camera_mode:
-        camera_mode_button_release_time = time.time()
-        # if single press and release within 2 seconds
-        if camera_mode_button_release_time - camera_mode_button_press_time <= 2:
+        # a short press (not yet a long press) captures an image
+        if not gesture_recognizer.long_press_fired:
             # capture image
             print("[Camera] Capturing image...")
-            if camera_thread is not None:
-                camera_thread.capture()
-                notification = {"event": "camera_capture"}
-                send_to_all_clients(notification)
-                # exit camera mode in 2 seconds after capture
-                threading.Timer(2.0, exit_camera_mode).start()
+            thread = camera_thread
+            if thread is not None:
+                thread.capture(on_saved=on_camera_capture_saved)
                 
         return  # Ignore button presses in camera mode
     """Function executed when button is released"""
@@ -349,105 +679,246 @@ def on_button_release():
     notification = {"event": "button_released"}
     send_to_all_clients(notification)
 
+def on_camera_capture_saved(image_path):
+    """Called from the camera's capture worker once the JPEG is on disk"""
+    notification = {"event": "camera_capture", "image_path": image_path}
+    send_to_all_clients(notification)
+    # exit camera mode in 2 seconds after capture
+    threading.Timer(2.0, exit_camera_mode).start()
+
+def on_camera_scene_event(event, info):
+    """motion / scene_stable from the camera's MotionDetector"""
+    notification = {"event": event, **info}
+    send_to_all_clients(notification)
+
+def set_camera_mode(whisplay, enabled, motion_detection=None):
+    global camera_mode, camera_thread
+    if enabled:
+        print("[Camera] Entering camera mode...")
+        camera_mode = True
+        if motion_detection is None:
+            motion_detection = os.getenv("WHISPLAY_CAMERA_MOTION", "false").lower() == "true"
+        motion_detector = None
+        if motion_detection:
+            motion_detector = MotionDetector(
+                on_camera_scene_event,
+                motion_threshold=float(os.getenv("WHISPLAY_MOTION_THRESHOLD", "12")),
+                stable_threshold=float(os.getenv("WHISPLAY_STABLE_THRESHOLD", "4")),
+                stable_ms=int(os.getenv("WHISPLAY_STABLE_MS", "800")),
+            )
+        thread = CameraThread(whisplay, camera_capture_image_path, motion_detector=motion_detector)
+        with camera_lock:
+            camera_thread = thread
+        thread.start()
+    else:
+        print("[Camera] Exiting camera mode...")
+        with camera_lock:
+            thread, camera_thread = camera_thread, None
+        if thread is not None:
+            thread.stop()
+        camera_mode = False
+
+RGB_EFFECTS = ("fade", "solid", "breathe", "blink")
+# Keys that change what is shown or want the user's attention; telemetry such as
+# battery_level is polled every few seconds and must not keep the display awake
+ACTIVITY_KEYS = ("text", "text_append", "status", "emoji", "image", "camera_mode", "RGB", "brightness")
+
+def _number_field(content, key, default=None):
+    """content[key] if it is a number, default if absent; raises ValueError otherwise"""
+    value = content.get(key, None)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"invalid {key}: {value!r}")
+    return value
+
+def _color_field(content, key):
+    """content[key] parsed as an RGB (0-255) tuple, None if absent; raises ValueError otherwise"""
+    value = content.get(key, None)
+    if not value:
+        return None
+    rgb255_tuple = ColorUtils.get_rgb255_from_any(value)
+    if rgb255_tuple is None:
+        raise ValueError(f"invalid {key}: {value!r}")
+    return rgb255_tuple
+
+def prepare_message(content, whisplay, deferred_actions):
+    """Decode and validate one protocol message without changing any state.
+    Hardware side effects (LED, backlight, camera) are appended to deferred_actions.
+    Returns a function that applies the message to the display state (call it
+    with display_state_lock held), so a batch is validated completely before
+    any of it is applied. Raises ValueError for a malformed message.
+    """
+    if not isinstance(content, dict):
+        raise ValueError("message must be a JSON object")
+    ack_mode = content.get("ack_mode", None)
+    if ack_mode is not None and ack_mode not in AckPolicy.MODES:
+        raise ValueError(f"unknown ack_mode: {ack_mode}")
+    for key, convert in (("ack_every", int), ("ack_interval_ms", float)):
+        if content.get(key) is not None:
+            try:
+                convert(content[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid {key}: {content[key]!r}")
+    status = content.get("status", None)
+    emoji = content.get("emoji", None)
+    text = content.get("text", None)
+    text_append = content.get("text_append", None)
+    rgb255_tuple = _color_field(content, "RGB")
+    # LED effect: "fade" (default), "solid", "breathe" or "blink"
+    rgb_effect = content.get("rgb_effect", "fade")
+    if rgb_effect not in RGB_EFFECTS:
+        raise ValueError(f"unknown rgb_effect: {rgb_effect!r}")
+    rgb_duration_ms = _number_field(content, "rgb_duration_ms", 500)
+    rgb_period_ms = _number_field(content, "rgb_period_ms")
+    brightness = _number_field(content, "brightness")
+    scroll_speed = _number_field(content, "scroll_speed", 2)
+    battery_level = content.get("battery_level", None)
+    battery_color = content.get("battery_color", None)
+    battery_tuple = _color_field(content, "battery_color") or (0, 0, 0)
+    image_path = content.get("image", None)
+    network_connected = content.get("network_connected", None)
+    rag_icon_visible = content.get("rag_icon_visible", None)
+    capture_image_path = content.get("capture_image_path", None)
+    # boolean to enable camera mode
+    camera_mode_requested = content.get("camera_mode", None)
+    # emit motion / scene_stable events during camera mode (default: WHISPLAY_CAMERA_MOTION)
+    motion_detection = content.get("motion_detection", None)
+
+    if rgb255_tuple is not None:
+        # LED animations run on the board's animator thread, none of these block
+        if rgb_effect == "solid":
+            deferred_actions.append(lambda: whisplay.set_rgb(*rgb255_tuple))
+        elif rgb_effect == "breathe":
+            deferred_actions.append(lambda: whisplay.set_rgb_breathe(*rgb255_tuple, period_ms=rgb_period_ms or 2000))
+        elif rgb_effect == "blink":
+            half_period = (rgb_period_ms or 500) / 2
+            deferred_actions.append(lambda: whisplay.set_rgb_blink(*rgb255_tuple, on_ms=half_period, off_ms=half_period))
+        else:
+            deferred_actions.append(lambda: whisplay.set_rgb_fade(*rgb255_tuple, duration_ms=rgb_duration_ms))
+
+    if brightness:
+        deferred_actions.append(lambda: display_power.set_brightness(brightness))
+
+    if camera_mode_requested is not None:
+        deferred_actions.append(lambda: set_camera_mode(whisplay, camera_mode_requested, motion_detection))
+
+    def apply():
+        global camera_capture_image_path
+        if capture_image_path is not None:
+            camera_capture_image_path = capture_image_path
+        if (text is not None) or (text_append is not None) or (status is not None) or (emoji is not None) or \
+           (battery_level is not None) or (battery_color is not None) or \
+                  (image_path is not None) or (network_connected is not None) or \
+                  (rag_icon_visible is not None):
+            _update_display_data(status, emoji, text, scroll_speed, battery_level, battery_tuple,
+                                 image_path, network_connected, rag_icon_visible, text_append)
+
+    return apply
+
 def handle_client(client_socket, addr, whisplay):
-    global camera_capture_image_path, camera_mode, camera_thread
     print(f"[Socket] Client {addr} connected")
-    clients[addr] = client_socket
+    connection = ClientConnection(client_socket, addr, max_queue=outbound_queue_size, policy=outbound_policy)
+    connection.start()
+    with clients_lock:
+        clients[addr] = connection
+    ack_policy = AckPolicy()
+    trace_latency = False
+    connection_id = next(connection_ids)
+    if session_recorder is not None:
+        session_recorder.record_open(connection_id)
     try:
-        buffer = ""
-        while True:
-            data = client_socket.recv(4096).decode("utf-8")
+        framer = LineFramer()
+        while not connection.closed:
+            # Wake up in time to send a pending batched ack even if the client goes quiet
+            readable, _, _ = select.select([client_socket], [], [], ack_policy.timeout(time.monotonic()))
+            if not readable:
+                ack = ack_policy.flush()
+                if ack:
+                    connection.enqueue(ack)
+                continue
+            data = client_socket.recv(4096)
             if not data:
                 break
-            buffer += data
-            
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                if not line.strip():
-                    continue
-                        
+            received_at = time.monotonic()
+            received_wall_time = time.time()
+
+            for line in framer.feed(data):
                 # print(f"[Socket - {addr}] Received data: {line}")
+                if session_recorder is not None:
+                    session_recorder.record_line(connection_id, line, received_at)
                 try:
-                    content = json.loads(line)
-                    transaction_id = content.get("transaction_id", None)
-                    status = content.get("status", None)
-                    emoji = content.get("emoji", None)
-                    text = content.get("text", None)
-                    rgbled = content.get("RGB", None)
-                    brightness = content.get("brightness", None)
-                    scroll_speed = content.get("scroll_speed", 2)
-                    response_to_client = content.get("response", None)
-                    battery_level = content.get("battery_level", None)
-                    battery_color = content.get("battery_color", None)
-                    image_path = content.get("image", None)
-                    network_connected = content.get("network_connected", None)
-                    rag_icon_visible = content.get("rag_icon_visible", None)
-                    capture_image_path = content.get("capture_image_path", None)
-                    # boolean to enable camera mode
-                    set_camera_mode = content.get("camera_mode", None)
-
-                    if rgbled:
-                        rgb255_tuple = ColorUtils.get_rgb255_from_any(rgbled)
-                        whisplay.set_rgb_fade(*rgb255_tuple, duration_ms=500)
-                    
-                    if battery_color:
-                        battery_tuple = ColorUtils.get_rgb255_from_any(battery_color)
-                    else:
-                        battery_tuple = (0, 0, 0)
-                        
-                    if brightness:
-                        whisplay.set_backlight(brightness)
-                        
-                    if capture_image_path is not None:
-                        camera_capture_image_path = capture_image_path
-                    
-                    if set_camera_mode is not None:
-                        if set_camera_mode:
-                            print("[Camera] Entering camera mode...")
-                            camera_mode = True
-                            camera_thread = CameraThread(whisplay, camera_capture_image_path)
-                            camera_thread.start()
-                        else:
-                            print("[Camera] Exiting camera mode...")
-                            if camera_thread is not None:
-                                camera_thread.stop()
-                                camera_thread = None
-                            camera_mode = False
-
-                    if (text is not None) or (status is not None) or (emoji is not None) or \
-                       (battery_level is not None) or (battery_color is not None) or \
-                              (image_path is not None) or (network_connected is not None) or \
-                              (rag_icon_visible is not None):
-                        update_display_data(status=status, emoji=emoji,
-                                     text=text, scroll_speed=scroll_speed,
-                                     battery_level=battery_level, battery_color=battery_tuple,
-                                                 image_path=image_path, network_connected=network_connected,
-                                                 rag_icon_visible=rag_icon_visible)
-
-                    client_socket.send(b"OK\n")
-                    if response_to_client:
+                    content = decode_message(line)
+                except ValueError:
+                    connection.enqueue(b"ERROR: invalid JSON\n")
+                    continue
+                try:
+                    # A JSON array is a batch, applied to the display state as one atomic change
+                    messages = content if isinstance(content, list) else [content]
+                    transaction_id = None
+                    deferred_actions = []
+                    # Validate the whole batch first, a bad element must not leave the others half-applied
+                    updates = [prepare_message(message, whisplay, deferred_actions) for message in messages]
+                    responses = [message["response"] for message in messages if message.get("response")]
+                    for message in messages:
+                        if "ack_mode" in message or "ack_every" in message or "ack_interval_ms" in message:
+                            ack_policy.configure(mode=message.get("ack_mode", None),
+                                                 every=message.get("ack_every", None),
+                                                 interval_ms=message.get("ack_interval_ms", None))
+                        transaction_id = message.get("transaction_id", transaction_id)
+                        if "trace_latency" in message:
+                            trace_latency = bool(message["trace_latency"])
+                        if message.get("stats"):
+                            # Collected outside the display lock, it reads render and SPI stats
+                            connection.enqueue(json.dumps({"stats": get_server_stats()}).encode("utf-8") + b"\n")
+                    with display_state_lock:
+                        for apply in updates:
+                            apply()
+                        if trace_latency and transaction_id is not None:
+                            # Registered before the lock is released, so the next render snapshot
+                            # that includes this state is always credited to the transaction
+                            latency_tracer.track(connection, transaction_id, display_state_serial,
+                                                 received_at, time.monotonic(), received_wall_time)
+                    if any(key in ACTIVITY_KEYS for message in messages for key in message):
+                        display_power.activity()
+                    for action in deferred_actions:
+                        action()
+
+                    ack = ack_policy.on_message(transaction_id, time.monotonic())
+                    if ack:
+                        connection.enqueue(ack)
+                    for response_to_client in responses:
                         try:
                             response_bytes = json.dumps({"response": response_to_client}).encode("utf-8") + b"\n"
-                            client_socket.send(response_bytes)
+                            connection.enqueue(response_bytes)
                             print(f"[Socket - {addr}] Sent response: {response_to_client}")
                         except Exception as e:
                             print(f"[Socket - {addr}] Response sending error: {e}")
                             
-                except json.JSONDecodeError:
-                    client_socket.send(b"ERROR: invalid JSON\n")
                 except Exception as e:
                     print(f"[Socket - {addr}] Data processing error: {e}")
-                    client_socket.send(f"ERROR: {e}\n".encode("utf-8"))
+                    connection.enqueue(f"ERROR: {e}\n".encode("utf-8"))
 
     except Exception as e:
         print(f"[Socket - {addr}] Connection error: {e}")
     finally:
-        print(f"[Socket] Client {addr} disconnected")
-        del clients[addr]
+        print(f"[Socket] Client {addr} disconnected: {connection.stats()}")
+        with clients_lock:
+            del clients[addr]
+        latency_tracer.forget(connection)
+        if session_recorder is not None:
+            session_recorder.record_close(connection_id)
+        connection.close()
         client_socket.close()
 
 def start_socket_server(render_thread, host='0.0.0.0', port=12345):
     # Register button events
+    global gesture_recognizer
+    gesture_recognizer = ButtonGestureRecognizer(
+        on_button_gesture,
+        double_click_ms=int(os.getenv("WHISPLAY_DOUBLE_CLICK_MS", "400")),
+        long_press_ms=int(os.getenv("WHISPLAY_LONG_PRESS_MS", "2000")),
+    )
     whisplay.on_button_press(on_button_pressed)
     whisplay.on_button_release(on_button_release)
 
@@ -471,33 +942,68 @@ def start_socket_server(render_thread, host='0.0.0.0', port=12345):
         server_socket.close()
 
 
+def create_board():
+    """Create the board selected by WHISPLAY_BOARD ("hardware", "emulator" or "null")"""
+    board_type = os.getenv("WHISPLAY_BOARD", "hardware")
+    if board_type == "null":
+        return NullWhisplayBoard()
+    if board_type == "emulator":
+        return WhisplayBoard(backend="emulator", emulator_options={
+            "realtime_spi": os.getenv("WHISPLAY_EMULATOR_REALTIME_SPI", "false").lower() == "true",
+            "framebuffer_path": os.getenv("WHISPLAY_EMULATOR_FRAMEBUFFER", None),
+            "max_speed_hz": int(os.getenv("WHISPLAY_EMULATOR_SPI_HZ", "100000000")),
+        })
+    return WhisplayBoard()
+
+
 if __name__ == "__main__":
-    whisplay = WhisplayBoard()
+    whisplay = create_board()
     print(f"[LCD] Initialization finished: {whisplay.LCD_WIDTH}x{whisplay.LCD_HEIGHT}")
     
+    trace_file = os.getenv("WHISPLAY_TRACE_FILE", None)
+    if trace_file:
+        session_recorder = SessionRecorder(trace_file)
+        print(f"[Trace] Recording inbound messages to {trace_file}")
+
+    if os.getenv("WHISPLAY_CAMERA_PREWARM", "false").lower() == "true":
+        # Open and configure the camera in the background so the first camera_mode is warm
+        threading.Thread(target=camera_standby.prewarm, args=(whisplay.LCD_WIDTH, whisplay.LCD_HEIGHT),
+                         daemon=True).start()
+
     # read CUSTOM_FONT_PATH from environment variable
     custom_font_path = os.getenv("CUSTOM_FONT_PATH", None)
     
+    display_power = DisplayPowerManager(
+        whisplay,
+        idle_timeout=float(os.getenv("WHISPLAY_IDLE_TIMEOUT_S", "60")),
+        sleep_timeout=float(os.getenv("WHISPLAY_SLEEP_TIMEOUT_S", "300")),
+        idle_brightness=int(os.getenv("WHISPLAY_IDLE_BRIGHTNESS", "10")),
+        panel_sleep=os.getenv("WHISPLAY_PANEL_SLEEP", "false").lower() == "true",
+    )
+
     # start render thread
-    render_thread = RenderThread(whisplay, custom_font_path or "NotoSansSC-Bold.ttf", fps=30)
+    governor = FrameRateGovernor(
+        active_fps=int(os.getenv("WHISPLAY_FPS_ACTIVE", "30")),
+        static_fps=int(os.getenv("WHISPLAY_FPS_STATIC", "5")),
+        throttled_fps=int(os.getenv("WHISPLAY_FPS_THROTTLED", "15")),
+        thermal_limit_c=float(os.getenv("WHISPLAY_THERMAL_LIMIT_C", "70")),
+        low_battery_level=int(os.getenv("WHISPLAY_LOW_BATTERY_LEVEL", "20")),
+    )
+    render_thread = RenderThread(whisplay, custom_font_path or "NotoSansSC-Bold.ttf",
+                                 fps=governor.active_fps, governor=governor)
     render_thread.start()
-    start_socket_server(render_thread, host='0.0.0.0', port=12345)
     
     def cleanup_and_exit(signum, frame):
         print("[System] Exiting...")
         render_thread.stop()
+        if session_recorder is not None:
+            session_recorder.close()
         whisplay.cleanup()
         sys.exit(0)
         
+    # Registered before the (blocking) server loop so SIGTERM also finalizes the trace file.
+    # SIGKILL and SIGSTOP cannot be caught.
     signal.signal(signal.SIGTERM, cleanup_and_exit)
     signal.signal(signal.SIGINT, cleanup_and_exit)
-    signal.signal(signal.SIGKILL, cleanup_and_exit)
     signal.signal(signal.SIGQUIT, cleanup_and_exit)
-    signal.signal(signal.SIGSTOP, cleanup_and_exit)
-    try:
-        # Keep the main thread alive
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        cleanup_and_exit(None, None)
-    
+    start_socket_server(render_thread, host='0.0.0.0', port=int(os.getenv("WHISPLAY_SOCKET_PORT", "12345")))
@@ -0,0 +1,109 @@
+"""Button gesture recognition from press/release timestamps.
+
+ButtonGestureRecognizer is fed raw press and release edges (with the time
+the edge happened, e.g. the kernel timestamp from the Radxa event path) and
+reports higher-level gestures as soon as they are decided:
+
+  "double_click" - on the second press, if it follows a short click within
+                   double_click_ms; no waiting for the second release
+  "long_press"   - while the button is still held, once long_press_ms passes
+  "click"        - a short press that was not followed by a second press
+                   within double_click_ms, reported when that window closes
+
+Raw button_pressed/button_released events are not delayed by any of this;
+clients that only need push-to-talk keep reacting to those immediately.
+All deadlines are handled by one timer thread instead of a Timer per press.
+"""
+import threading
+import time
+
+
+class ButtonGestureRecognizer:
+    def __init__(self, on_gesture, double_click_ms=400, long_press_ms=2000):
+        """on_gesture(name, info) is called from the caller's or the timer thread"""
+        self.on_gesture = on_gesture
+        self.double_click_ms = double_click_ms
+        self.long_press_ms = long_press_ms
+        self.pressed = False
+        self.press_time = None
+        self.long_press_fired = False
+        self._double_click = False
+        self._long_press_deadline = None
+        self._click_deadline = None
+        self._click_release_time = None
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ButtonGestures", daemon=True)
+        self._thread.start()
+
+    def press(self, timestamp=None):
+        """Record a press edge (time.monotonic() seconds)"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        gesture = None
+        with self._cond:
+            self.pressed = True
+            self.press_time = timestamp
+            self.long_press_fired = False
+            self._double_click = False
+            if self._click_deadline is not None and \
+                    (timestamp - self._click_release_time) * 1000 <= self.double_click_ms:
+                # Second press of a double click, decided right now
+                self._double_click = True
+                gesture = ("double_click", {
+                    "interval_ms": round((timestamp - self._click_release_time) * 1000, 1),
+                })
+            self._click_deadline = None
+            self._long_press_deadline = timestamp + self.long_press_ms / 1000
+            self._cond.notify()
+        if gesture:
+            self._emit(*gesture)
+
+    def release(self, timestamp=None):
+        """Record a release edge. Returns the press duration in ms (None if no press was seen)"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._cond:
+            if not self.pressed:
+                return None
+            self.pressed = False
+            self._long_press_deadline = None
+            duration_ms = (timestamp - self.press_time) * 1000
+            if not self.long_press_fired and not self._double_click:
+                self._click_release_time = timestamp
+                self._click_deadline = timestamp + self.double_click_ms / 1000
+            self._cond.notify()
+        return duration_ms
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _emit(self, name, info):
+        try:
+            self.on_gesture(name, info)
+        except Exception as e:
+            print(f"[Button] Gesture callback error: {e}")
+
+    def _run(self):
+        while True:
+            gesture = None
+            with self._cond:
+                if not self._running:
+                    return
+                deadlines = [d for d in (self._long_press_deadline, self._click_deadline) if d is not None]
+                if not deadlines:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                if min(deadlines) > now:
+                    self._cond.wait(min(deadlines) - now)
+                    continue
+                if self._long_press_deadline is not None and self._long_press_deadline <= now:
+                    self._long_press_deadline = None
+                    self.long_press_fired = True
+                    gesture = ("long_press", {"duration_ms": self.long_press_ms})
+                elif self._click_deadline is not None and self._click_deadline <= now:
+                    self._click_deadline = None
+                    gesture = ("click", {})
+            if gesture:
+                self._emit(*gesture)
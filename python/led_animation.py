@@ -0,0 +1,220 @@
+"""Non-blocking RGB LED animations for the Whisplay board.
+
+A single LedAnimator thread steps the active animation and writes the
+colour through a callback. Starting a new animation replaces the running
+one immediately and continues from whatever colour the LED shows at that
+moment, so retargeting mid-fade never jumps. When no animation is running
+the thread sleeps until the next request instead of polling.
+"""
+import math
+import threading
+import time
+
+
+def ease_linear(t):
+    return t
+
+
+def ease_in_quad(t):
+    return t * t
+
+
+def ease_out_quad(t):
+    return t * (2 - t)
+
+
+def ease_in_out_quad(t):
+    return 2 * t * t if t < 0.5 else 1 - (-2 * t + 2) ** 2 / 2
+
+
+def ease_in_out_sine(t):
+    return -(math.cos(math.pi * t) - 1) / 2
+
+
+EASINGS = {
+    "linear": ease_linear,
+    "ease_in": ease_in_quad,
+    "ease_out": ease_out_quad,
+    "ease_in_out": ease_in_out_quad,
+    "sine": ease_in_out_sine,
+}
+
+
+def _mix(start, end, amount):
+    return tuple(int(round(a + (b - a) * amount)) for a, b in zip(start, end))
+
+
+class Fade:
+    """Transition from the current colour to `target` over duration_ms"""
+
+    def __init__(self, target, duration_ms=500, easing="ease_in_out"):
+        self.target = tuple(target)
+        self.duration = max(0.0, duration_ms / 1000.0)
+        self.easing = EASINGS[easing]
+        self.start_color = None
+
+    def begin(self, current_color):
+        self.start_color = tuple(current_color)
+
+    def color_at(self, elapsed):
+        """Return (color, finished)"""
+        if self.duration == 0 or elapsed >= self.duration:
+            return self.target, True
+        return _mix(self.start_color, self.target, self.easing(elapsed / self.duration)), False
+
+
+class Breathe:
+    """Pulse between `low` and `high`; runs until replaced unless cycles is set"""
+
+    def __init__(self, high, low=(0, 0, 0), period_ms=2000, easing="sine", cycles=None):
+        self.high = tuple(high)
+        self.low = tuple(low)
+        self.period = max(0.05, period_ms / 1000.0)
+        self.easing = EASINGS[easing]
+        self.cycles = cycles
+        self.start_color = None
+
+    def begin(self, current_color):
+        self.start_color = tuple(current_color)
+
+    def color_at(self, elapsed):
+        if self.cycles is not None and elapsed >= self.cycles * self.period:
+            return self.low, True
+        phase = (elapsed % self.period) / self.period
+        # Rise during the first half of the period, fall during the second
+        level = self.easing(phase * 2 if phase < 0.5 else 2 - phase * 2)
+        return _mix(self.low, self.high, level), False
+
+
+class Blink:
+    """Hard on/off blinking; runs until replaced unless count is set"""
+
+    def __init__(self, on_color, off_color=(0, 0, 0), on_ms=250, off_ms=250, count=None):
+        self.on_color = tuple(on_color)
+        self.off_color = tuple(off_color)
+        self.on_time = max(0.01, on_ms / 1000.0)
+        self.period = self.on_time + max(0.01, off_ms / 1000.0)
+        self.count = count
+        self.start_color = None
+
+    def begin(self, current_color):
+        self.start_color = tuple(current_color)
+
+    def color_at(self, elapsed):
+        if self.count is not None and elapsed >= self.count * self.period:
+            return self.off_color, True
+        if elapsed % self.period < self.on_time:
+            return self.on_color, False
+        return self.off_color, False
+
+    def next_change(self, elapsed):
+        """Seconds until the output changes, so the thread can sleep between edges"""
+        position = elapsed % self.period
+        if position < self.on_time:
+            return self.on_time - position
+        return self.period - position
+
+
+class LedAnimator:
+    """Runs LED animations on one background thread.
+
+    apply_color(r, g, b) receives 0-255 values, from the animator thread
+    when an animation step changes the colour, or from the caller of
+    set_color(). Calls never overlap.
+    """
+
+    def __init__(self, apply_color, frame_rate=60):
+        self._apply_color = apply_color
+        self.frame_interval = 1.0 / frame_rate
+        self.current_color = (0, 0, 0)
+        self._animation = None
+        self._started_at = 0.0
+        # Bumped on every request so a frame computed for a replaced animation is never written
+        self._generation = 0
+        self._apply_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="LedAnimator", daemon=True)
+        self._thread.start()
+
+    def play(self, animation):
+        """Replace the running animation (if any) and return immediately"""
+        with self._cond:
+            animation.begin(self.current_color)
+            self._animation = animation
+            self._started_at = time.monotonic()
+            self._generation += 1
+            self._cond.notify()
+
+    def fade(self, r, g, b, duration_ms=500, easing="ease_in_out"):
+        self.play(Fade((r, g, b), duration_ms, easing))
+
+    def breathe(self, r, g, b, period_ms=2000, low=(0, 0, 0), easing="sine", cycles=None):
+        self.play(Breathe((r, g, b), low, period_ms, easing, cycles))
+
+    def blink(self, r, g, b, on_ms=250, off_ms=250, off_color=(0, 0, 0), count=None):
+        self.play(Blink((r, g, b), off_color, on_ms, off_ms, count))
+
+    def set_color(self, r, g, b):
+        """Cancel any animation and write the colour before returning"""
+        color = (r, g, b)
+        with self._apply_lock:
+            with self._cond:
+                self._animation = None
+                self._generation += 1
+                self.current_color = color
+                self._cond.notify()
+            self._apply_color(*color)
+
+    def cancel(self):
+        """Stop the running animation, leaving the LED at its current colour"""
+        with self._cond:
+            self._animation = None
+            self._generation += 1
+            self._cond.notify()
+
+    def is_animating(self):
+        with self._cond:
+            return self._animation is not None
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._animation = None
+            self._cond.notify()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._animation is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                animation = self._animation
+                generation = self._generation
+                elapsed = time.monotonic() - self._started_at
+                color, finished = animation.color_at(elapsed)
+            with self._apply_lock:
+                with self._cond:
+                    if generation != self._generation:
+                        # Replaced while computing, start over with the new request
+                        continue
+                    changed = color != self.current_color
+                    self.current_color = color
+                    if finished:
+                        self._animation = None
+                if changed:
+                    try:
+                        self._apply_color(*color)
+                    except Exception as e:
+                        print(f"[LED] Failed to set colour: {e}")
+            if finished:
+                continue
+            delay = self.frame_interval
+            if hasattr(animation, "next_change"):
+                delay = animation.next_change(elapsed)
+            with self._cond:
+                # A new request wakes the thread early
+                if self._animation is animation and self._running:
+                    self._cond.wait(delay)
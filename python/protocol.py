@@ -0,0 +1,369 @@
+import gzip
+import json
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def decode_message(line):
+    """Decode one framed line (bytes) into a JSON object.
+
+    Uses orjson when it is installed. Invalid UTF-8 and invalid JSON both
+    raise ValueError so callers only need to handle a single error type.
+    """
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line.decode("utf-8"))
+
+
+class LineFramer:
+    """Incremental newline framer working on raw bytes.
+
+    Bytes are accumulated until a full line is available, so multi-byte
+    UTF-8 characters split across recv() chunks are never decoded on their
+    own. Only newly received bytes are scanned for the delimiter, which keeps
+    the cost linear in the payload size no matter how many chunks it spans.
+    """
+
+    def __init__(self, delimiter=b"\n"):
+        self.delimiter = delimiter
+        self._buffer = bytearray()
+        self._scan_pos = 0
+
+    def feed(self, data):
+        """Append received bytes and return the list of complete, non-empty lines"""
+        self._buffer += data
+        lines = []
+        start = 0
+        pos = self._buffer.find(self.delimiter, self._scan_pos)
+        while pos != -1:
+            line = bytes(self._buffer[start:pos])
+            if line.strip():
+                lines.append(line)
+            start = pos + len(self.delimiter)
+            pos = self._buffer.find(self.delimiter, start)
+        if start:
+            del self._buffer[:start]
+        # Everything left is a partial line without a delimiter, skip it next time
+        self._scan_pos = max(0, len(self._buffer) - len(self.delimiter) + 1)
+        return lines
+
+    def pending_bytes(self):
+        return len(self._buffer)
+
+
+class AckPolicy:
+    """Per-connection acknowledgement policy.
+
+    Modes:
+      "each"  - reply b"OK\n" after every message (default, original behaviour)
+      "batch" - reply {"ack": count, "transaction_id": last} after `every`
+                messages or once `interval_ms` has passed since the first
+                unacknowledged one, whichever comes first
+      "none"  - fire-and-forget, never acknowledge
+    """
+
+    MODES = ("each", "batch", "none")
+
+    def __init__(self):
+        self.mode = "each"
+        self.every = 1
+        self.interval_ms = 0
+        self._pending = 0
+        self._last_transaction_id = None
+        self._first_pending_at = None
+
+    def configure(self, mode=None, every=None, interval_ms=None):
+        if mode is not None:
+            if mode not in self.MODES:
+                raise ValueError(f"unknown ack_mode: {mode}")
+            self.mode = mode
+        if every is not None:
+            self.every = max(1, int(every))
+        if interval_ms is not None:
+            self.interval_ms = max(0, float(interval_ms))
+
+    def on_message(self, transaction_id, now):
+        """Record a processed message, return the bytes to send back (or None)"""
+        if self.mode == "each":
+            return b"OK\n"
+        if self.mode == "none":
+            return None
+        self._pending += 1
+        if transaction_id is not None:
+            self._last_transaction_id = transaction_id
+        if self._first_pending_at is None:
+            self._first_pending_at = now
+        if self._pending >= self.every:
+            return self.flush()
+        return self.poll(now)
+
+    def poll(self, now):
+        """Return a batched ack if the interval has elapsed"""
+        if self._pending and self.interval_ms and \
+                (now - self._first_pending_at) * 1000 >= self.interval_ms:
+            return self.flush()
+        return None
+
+    def timeout(self, now):
+        """Seconds until a pending batched ack is due, None if nothing is pending"""
+        if not self._pending or not self.interval_ms:
+            return None
+        return max(0.0, self._first_pending_at + self.interval_ms / 1000 - now)
+
+    def flush(self):
+        if not self._pending:
+            return None
+        ack = {"ack": self._pending, "transaction_id": self._last_transaction_id}
+        self._pending = 0
+        self._first_pending_at = None
+        return json.dumps(ack).encode("utf-8") + b"\n"
+
+
+class ClientConnection:
+    """A connected display client with a bounded outbound event queue.
+
+    Every write to the socket goes through enqueue() and is performed by the
+    connection's own writer thread, so callers such as GPIO callbacks never
+    block on a slow reader. Droppable messages (events) count against
+    max_queue and are subject to the backpressure policy once it is full:
+      "drop_oldest" - discard the oldest queued event
+      "disconnect"  - close the connection
+    Acks and responses go through a separate priority queue that is drained
+    first, is never dropped and does not count against the limit, since
+    clients match them in order.
+    """
+
+    POLICIES = ("drop_oldest", "disconnect")
+
+    def __init__(self, sock, addr, max_queue=64, policy="drop_oldest"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown outbound policy: {policy}")
+        self.sock = sock
+        self.addr = addr
+        # Acks and events are small separate writes; with Nagle's algorithm each one
+        # waits for the peer's (delayed) ACK of the previous one, about a frame later
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.nodelay = True
+        except OSError:
+            # Not a TCP socket
+            self.nodelay = False
+        self.max_queue = max_queue
+        self.policy = policy
+        self.closed = False
+        self.queued_count = 0
+        self.replies_queued_count = 0
+        self.dropped_count = 0
+        self.sent_count = 0
+        self._events = deque()
+        self._replies = deque()
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._drain, daemon=True)
+
+    def start(self):
+        self._writer.start()
+
+    def enqueue(self, data, droppable=False):
+        """Queue bytes for sending. Returns False if the message was not queued."""
+        with self._cond:
+            if self.closed:
+                return False
+            if not droppable:
+                self._replies.append(data)
+                self.replies_queued_count += 1
+                self._cond.notify()
+                return True
+            if len(self._events) >= self.max_queue:
+                if self.policy == "disconnect":
+                    print(f"[Socket - {self.addr}] Outbound queue full, disconnecting slow client")
+                    self.dropped_count += 1
+                    self._close_locked()
+                    return False
+                self._events.popleft()
+                self.dropped_count += 1
+            self._events.append(data)
+            self.queued_count += 1
+            self._cond.notify()
+            return True
+
+    def _drain(self):
+        while True:
+            with self._cond:
+                while not self._replies and not self._events and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    return
+                data = self._replies.popleft() if self._replies else self._events.popleft()
+            try:
+                self.sock.sendall(data)
+                self.sent_count += 1
+            except Exception as e:
+                print(f"[Socket - {self.addr}] Send error: {e}")
+                self.close()
+                return
+
+    def _close_locked(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._events.clear()
+        self._replies.clear()
+        self._cond.notify_all()
+        try:
+            # Unblocks the reader thread still waiting in recv()
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._cond:
+            self._close_locked()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": self.queued_count,
+                "replies_queued": self.replies_queued_count,
+                "dropped": self.dropped_count,
+                "sent": self.sent_count,
+                "pending": len(self._events),
+                "replies_pending": len(self._replies),
+                "nodelay": self.nodelay,
+            }
+
+
+class LatencyTracer:
+    """Tracks traced transactions until the first frame containing them reaches the LCD.
+
+    Each tracked transaction records the display state serial it produced.
+    When the render thread reports that a frame built from serial N has been
+    flushed over SPI, every transaction with a serial <= N gets a
+    {"event": "rendered", ...} message with its timings in milliseconds.
+    The client-side latency includes delivering the event, which is only
+    close to the render latency because connections disable Nagle
+    (ClientConnection sets TCP_NODELAY); test/socket-benchmark.py reports
+    whether that held.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def track(self, connection, transaction_id, serial, received_at, applied_at, received_wall_time):
+        with self._lock:
+            self._pending.append((serial, connection, transaction_id, received_at, applied_at, received_wall_time))
+
+    def frame_flushed(self, serial, flushed_at):
+        with self._lock:
+            if not self._pending:
+                return
+            ready = [item for item in self._pending if item[0] <= serial]
+            self._pending = [item for item in self._pending if item[0] > serial]
+        for _, connection, transaction_id, received_at, applied_at, received_wall_time in ready:
+            event = {
+                "event": "rendered",
+                "transaction_id": transaction_id,
+                "received_at": received_wall_time,
+                "receive_to_apply_ms": round((applied_at - received_at) * 1000, 3),
+                "apply_to_flush_ms": round((flushed_at - applied_at) * 1000, 3),
+                "receive_to_flush_ms": round((flushed_at - received_at) * 1000, 3),
+            }
+            connection.enqueue(json.dumps(event).encode("utf-8") + b"\n", droppable=True)
+
+    def forget(self, connection):
+        with self._lock:
+            self._pending = [item for item in self._pending if item[1] is not connection]
+
+
+TRACE_MAGIC = b"WHISPLAY-TRACE 1\n"
+TRACE_RECORD = struct.Struct("<dBII")  # seconds since start, kind, connection id, payload length
+TRACE_OPEN = 0
+TRACE_LINE = 1
+TRACE_CLOSE = 2
+
+
+def _open_trace_file(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+class SessionRecorder:
+    """Writes every inbound protocol line with a monotonic timestamp.
+
+    Records are binary: a fixed header (TRACE_RECORD) followed by the raw
+    line bytes. Paths ending in .gz are gzip-compressed. Replay the file
+    with python/test/trace-replay.py.
+
+    The file is flushed every `flush_every` records or once `flush_interval`
+    seconds have passed since the last flush, and always on close(); a
+    flush per line would write a gzip sync block for every record.
+    """
+
+    def __init__(self, path, flush_every=64, flush_interval=1.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._file = _open_trace_file(path, "wb")
+        self._file.write(TRACE_MAGIC)
+        self._start = time.monotonic()
+        self._unflushed = 0
+        self._last_flush = self._start
+        self._lock = threading.Lock()
+
+    def _write(self, kind, connection_id, payload=b"", timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(TRACE_RECORD.pack(timestamp - self._start, kind, connection_id, len(payload)))
+            self._file.write(payload)
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every or timestamp - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._unflushed = 0
+                self._last_flush = timestamp
+
+    def record_open(self, connection_id):
+        self._write(TRACE_OPEN, connection_id)
+
+    def record_line(self, connection_id, line, timestamp=None):
+        self._write(TRACE_LINE, connection_id, line, timestamp)
+
+    def record_close(self, connection_id):
+        self._write(TRACE_CLOSE, connection_id)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_trace(path):
+    """Yield (seconds, kind, connection_id, payload) records from a session trace"""
+    with _open_trace_file(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a whisplay session trace")
+        while True:
+            try:
+                header = f.read(TRACE_RECORD.size)
+                if len(header) < TRACE_RECORD.size:
+                    return
+                timestamp, kind, connection_id, length = TRACE_RECORD.unpack(header)
+                payload = f.read(length)
+            except EOFError:
+                # Truncated gzip stream, the recorder was killed before closing the file
+                return
+            if len(payload) < length:
+                return
+            yield timestamp, kind, connection_id, payload
@@ -0,0 +1,133 @@
+"""Helpers shared by the display socket benchmark scripts.
+
+Starts chatbot-ui.py with a stand-in board, samples its CPU time and memory
+from /proc and talks to its {"stats": true} endpoint.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CHATBOT_UI = os.path.join(PYTHON_DIR, "chatbot-ui.py")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 3),
+        "p90": round(percentile(values, 90), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def spawn_server(port, board="null", extra_env=None, quiet=True):
+    """Start chatbot-ui.py on the given port with a stand-in board"""
+    env = dict(os.environ)
+    env["WHISPLAY_BOARD"] = board
+    env["WHISPLAY_SOCKET_PORT"] = str(port)
+    env["PYTHONUNBUFFERED"] = "1"
+    if extra_env:
+        env.update(extra_env)
+    output = subprocess.DEVNULL if quiet else None
+    process = subprocess.Popen([sys.executable, CHATBOT_UI], cwd=PYTHON_DIR, env=env,
+                               stdout=output, stderr=output)
+    wait_for_port("127.0.0.1", port, process)
+    return process
+
+
+def wait_for_port(host, port, process=None, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not listen on {host}:{port} within {timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class ProcessMonitor:
+    """Reads CPU time and memory of a process from /proc"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._start_cpu = None
+        self._start_wall = None
+
+    def cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15, counted after the ")" of comm
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+    def memory_kb(self):
+        values = {}
+        with open(f"/proc/{self.pid}/status", "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    values[key] = int(value.split()[0])
+        return {"rss_kb": values.get("VmRSS"), "peak_rss_kb": values.get("VmHWM")}
+
+    def start(self):
+        self._start_cpu = self.cpu_seconds()
+        self._start_wall = time.monotonic()
+
+    def cpu_percent(self):
+        elapsed = time.monotonic() - self._start_wall
+        if elapsed <= 0:
+            return 0.0
+        return (self.cpu_seconds() - self._start_cpu) / elapsed * 100
+
+
+def request_stats(host, port, timeout=5):
+    """Open a short-lived connection and return the server's stats dict"""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(b'{"stats": true}\n')
+        buffer = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                raise RuntimeError("connection closed before stats arrived")
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                if line.startswith(b"{"):
+                    message = json.loads(line)
+                    if "stats" in message:
+                        return message["stats"]
+
+
+def render_fps(stats_before, stats_after):
+    render_before = stats_before.get("render") or {}
+    render_after = stats_after.get("render") or {}
+    elapsed = stats_after["time"] - stats_before["time"]
+    if elapsed <= 0:
+        return None
+    return round((render_after.get("frames", 0) - render_before.get("frames", 0)) / elapsed, 2)
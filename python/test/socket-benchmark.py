@@ -0,0 +1,239 @@
+"""Load test for the display socket server (chatbot-ui.py).
+
+Opens N concurrent clients that replay streaming-answer traffic at a fixed
+rate and reports ack latency percentiles, "rendered" latency (see
+trace_latency), server CPU and achieved render fps.
+
+Both latencies are measured at the client, so they include socket delivery.
+"server_nodelay" must be true for them to mean anything: with Nagle enabled
+on the server side every ack waits behind the previous event for the
+client's delayed ACK (append/cjk at --rate 30: ack p50 33.5 ms instead of
+0.4 ms, rendered p50 33.6 ms instead of 17.4 ms).
+
+Examples:
+  # start chatbot-ui.py with the stand-in board and run against it
+  python3 socket-benchmark.py --spawn-server --clients 2 --rate 20 --style append --corpus cjk
+
+  # measure an already running server
+  python3 socket-benchmark.py --port 12345 --server-pid 1234 --json-out result.json
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+from bench_common import (ProcessMonitor, render_fps, request_stats, spawn_server,
+                          stop_server, summarize)
+
+CORPUS = {
+    "latin": "The quick brown fox jumps over the lazy dog while the display keeps scrolling. ",
+    "emoji": "Sure 😄 here you go 🎉 weather is ☀️ then 🌧️ later, enjoy 🍕🍔🍟 and have fun 🚀✨ ",
+    "cjk": "这是一个性能测试，用来验证滚动渲染系统能否高效处理长文本内容。今天天气真不错，阳光明媚。",
+}
+CORPUS["mixed"] = CORPUS["latin"] + CORPUS["emoji"] + CORPUS["cjk"]
+
+
+class BenchmarkClient(threading.Thread):
+    """Streams answers chunk by chunk and records ack / rendered latency"""
+
+    def __init__(self, index, args, stop_event):
+        super().__init__(daemon=True)
+        self.index = index
+        self.args = args
+        self.stop_event = stop_event
+        self.sock = socket.create_connection((args.host, args.port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.inflight = deque()
+        self.inflight_lock = threading.Lock()
+        self.sent_times = {}
+        self.ack_latencies_ms = []
+        self.rendered_latencies_ms = []
+        self.server_latencies_ms = []
+        self.sent = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        self.random = random.Random(args.seed + index)
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+
+    def read_loop(self):
+        buffer = b""
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                self.handle_line(line, time.monotonic())
+
+    def handle_line(self, line, now):
+        if line == b"OK":
+            with self.inflight_lock:
+                if self.inflight:
+                    _, sent_at = self.inflight.popleft()
+                    self.ack_latencies_ms.append((now - sent_at) * 1000)
+            return
+        if line.startswith(b"ERROR"):
+            self.errors += 1
+            return
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        if message.get("event") == "rendered":
+            self.server_latencies_ms.append(message["receive_to_flush_ms"])
+            sent_at = self.sent_times.pop(message["transaction_id"], None)
+            if sent_at is not None:
+                self.rendered_latencies_ms.append((now - sent_at) * 1000)
+
+    def send(self, message):
+        transaction_id = f"{self.index}-{self.sent}"
+        message["transaction_id"] = transaction_id
+        payload = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        sent_at = time.monotonic()
+        with self.inflight_lock:
+            self.inflight.append((transaction_id, sent_at))
+        if self.args.trace:
+            self.sent_times[transaction_id] = sent_at
+        self.sock.sendall(payload)
+        self.sent += 1
+        self.bytes_sent += len(payload)
+
+    def next_chunk(self, corpus):
+        start = self.random.randrange(len(corpus))
+        size = self.args.chunk_chars
+        return (corpus[start:] + corpus)[:size]
+
+    def run(self):
+        self.reader.start()
+        self.send({"trace_latency": self.args.trace, "status": f"bench {self.index}", "emoji": "⚡", "text": ""})
+        corpus = CORPUS[self.args.corpus]
+        interval = 1 / self.args.rate
+        answer = ""
+        next_send = time.monotonic()
+        while not self.stop_event.is_set():
+            if len(answer) >= self.args.answer_chars:
+                # Start a new answer, which resets scrolling on the server
+                answer = ""
+                self.send({"status": "answering", "text": ""})
+            chunk = self.next_chunk(corpus)
+            answer += chunk
+            if self.args.style == "append":
+                self.send({"text_append": chunk, "scroll_speed": self.args.scroll_speed})
+            else:
+                self.send({"text": answer, "scroll_speed": self.args.scroll_speed})
+            next_send += interval
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def run_benchmark(args):
+    server = None
+    monitor = None
+    if args.spawn_server:
+        server = spawn_server(args.port, board=args.board, quiet=not args.server_output)
+        monitor = ProcessMonitor(server.pid)
+    elif args.server_pid:
+        monitor = ProcessMonitor(args.server_pid)
+
+    try:
+        # Let the render thread get past the startup logo before measuring
+        time.sleep(args.warmup)
+        stats_before = request_stats(args.host, args.port)
+        if monitor:
+            monitor.start()
+
+        stop_event = threading.Event()
+        clients = [BenchmarkClient(i, args, stop_event) for i in range(args.clients)]
+        for client in clients:
+            client.start()
+        time.sleep(args.duration)
+        stop_event.set()
+        for client in clients:
+            client.join()
+        # Give outstanding acks and rendered events a moment to arrive
+        time.sleep(args.drain)
+
+        stats_after = request_stats(args.host, args.port)
+        result = {
+            "label": args.label,
+            "config": {
+                "clients": args.clients,
+                "rate": args.rate,
+                "duration": args.duration,
+                "style": args.style,
+                "corpus": args.corpus,
+                "chunk_chars": args.chunk_chars,
+                "answer_chars": args.answer_chars,
+                "board": args.board if args.spawn_server else None,
+            },
+            "messages_sent": sum(c.sent for c in clients),
+            "bytes_sent": sum(c.bytes_sent for c in clients),
+            "errors": sum(c.errors for c in clients),
+            "ack_latency_ms": summarize([v for c in clients for v in c.ack_latencies_ms]),
+            "rendered_latency_ms": summarize([v for c in clients for v in c.rendered_latencies_ms]),
+            "server_receive_to_flush_ms": summarize([v for c in clients for v in c.server_latencies_ms]),
+            "server_nodelay": all(c.get("nodelay", False) for c in stats_after.get("clients", {}).values()),
+            "render_fps": render_fps(stats_before, stats_after),
+            "render": stats_after.get("render"),
+            "spi": stats_after.get("spi"),
+            "server_cpu_percent": round(monitor.cpu_percent(), 1) if monitor else None,
+            "server_memory": monitor.memory_kb() if monitor else None,
+        }
+        for client in clients:
+            client.close()
+        return result
+    finally:
+        if server is not None:
+            stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Display socket server benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--spawn-server", action="store_true", help="start chatbot-ui.py with a stand-in board")
+    parser.add_argument("--board", default="null", help="WHISPLAY_BOARD value for --spawn-server")
+    parser.add_argument("--server-output", action="store_true", help="show the spawned server's output")
+    parser.add_argument("--server-pid", type=int, help="pid of an already running server, for CPU/memory")
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=20, help="updates per second per client")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic")
+    parser.add_argument("--style", choices=["full", "append"], default="full")
+    parser.add_argument("--corpus", choices=sorted(CORPUS), default="mixed")
+    parser.add_argument("--chunk-chars", type=int, default=8, help="characters added per update")
+    parser.add_argument("--answer-chars", type=int, default=1500, help="answer length before starting a new one")
+    parser.add_argument("--scroll-speed", type=int, default=2)
+    parser.add_argument("--no-trace", dest="trace", action="store_false", help="do not request rendered events")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--drain", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="free-form label, e.g. a commit id")
+    parser.add_argument("--json-out", help="write the result as JSON to this file")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if not result["server_nodelay"]:
+        print("WARNING: the server did not disable Nagle on every connection; latencies include TCP buffering")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Replay a session trace recorded with WHISPLAY_TRACE_FILE against chatbot-ui.py.
+
+The server is started with the emulated board (fake SPI), every recorded
+connection is reopened and its lines are sent at their recorded times,
+optionally sped up. Afterwards frame times, server CPU and peak RSS are
+reported.
+
+Examples:
+  python3 trace-replay.py session.trace
+  python3 trace-replay.py session.trace.gz --speed 4 --realtime-spi --json-out replay.json
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from bench_common import PYTHON_DIR, ProcessMonitor, render_fps, request_stats, spawn_server, stop_server
+
+sys.path.insert(0, PYTHON_DIR)
+from protocol import TRACE_CLOSE, TRACE_LINE, TRACE_OPEN, read_trace  # noqa: E402
+
+
+class ReplayConnection:
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.replies = 0
+        # Keep reading so acks and events never back up into the server
+        self.reader = threading.Thread(target=self._drain, daemon=True)
+        self.reader.start()
+
+    def _drain(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            self.replies += data.count(b"\n")
+
+    def send_line(self, line):
+        self.sock.sendall(line + b"\n")
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def replay(args):
+    records = list(read_trace(args.trace))
+    if not records:
+        raise SystemExit(f"{args.trace} contains no records")
+
+    extra_env = {"WHISPLAY_EMULATOR_REALTIME_SPI": "true" if args.realtime_spi else "false"}
+    server = spawn_server(args.port, board=args.board, extra_env=extra_env, quiet=not args.server_output)
+    monitor = ProcessMonitor(server.pid)
+    connections = {}
+    lines_sent = 0
+    max_lag = 0.0
+    try:
+        time.sleep(args.warmup)
+        stats_before = request_stats("127.0.0.1", args.port)
+        monitor.start()
+        replay_start = time.monotonic()
+        first_timestamp = records[0][0]
+        for timestamp, kind, connection_id, payload in records:
+            if args.speed > 0:
+                target = replay_start + (timestamp - first_timestamp) / args.speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            if kind == TRACE_OPEN or (kind == TRACE_LINE and connection_id not in connections):
+                connections[connection_id] = ReplayConnection("127.0.0.1", args.port)
+            if kind == TRACE_LINE:
+                connections[connection_id].send_line(payload)
+                lines_sent += 1
+            elif kind == TRACE_CLOSE and connection_id in connections:
+                connections.pop(connection_id).close()
+        replay_duration = time.monotonic() - replay_start
+        time.sleep(args.drain)
+
+        stats_after = request_stats("127.0.0.1", args.port)
+        return {
+            "trace": os.path.abspath(args.trace),
+            "speed": args.speed,
+            "board": args.board,
+            "realtime_spi": args.realtime_spi,
+            "recorded_duration_s": round(records[-1][0] - first_timestamp, 3),
+            "replay_duration_s": round(replay_duration, 3),
+            "max_schedule_lag_ms": round(max_lag * 1000, 3),
+            "lines_sent": lines_sent,
+            "render_fps": render_fps(stats_before, stats_after),
+            "render": stats_after.get("render"),
+            "spi": stats_after.get("spi"),
+            "server_cpu_percent": round(monitor.cpu_percent(), 1),
+            "server_memory": monitor.memory_kb(),
+        }
+    finally:
+        for connection in connections.values():
+            connection.close()
+        stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a display session trace")
+    parser.add_argument("trace", help="file written by chatbot-ui.py with WHISPLAY_TRACE_FILE")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale, 2 = twice as fast, 0 = no delays")
+    parser.add_argument("--port", type=int, default=12346)
+    parser.add_argument("--board", default="emulator", help="WHISPLAY_BOARD for the replay server")
+    parser.add_argument("--realtime-spi", action="store_true", help="delay SPI writes like the real bus")
+    parser.add_argument("--server-output", action="store_true", help="show the server's output")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--drain", type=float, default=1)
+    parser.add_argument("--json-out", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    result = replay(args)
+    print(json.dumps(result, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
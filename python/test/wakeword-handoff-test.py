@@ -0,0 +1,119 @@
+"""Check that the wake word handoff keeps a question asked after a pause.
+
+Builds a 16 kHz WAV of room noise, the wake word, a gap (in which ChatFlow
+plays the chime) and then a stretch of "speech", runs wakeword.py on it
+through a file: source and checks that the handoff WAV still holds the
+speech instead of closing right after the wake word.
+
+openWakeWord and its models must be installed. Pass a recording of the wake
+word with --wake; without it a loud noise burst stands in for it, which only
+a model that fires on such a burst will detect.
+
+Examples:
+  python3 wakeword-handoff-test.py --wake hey_jarvis.wav
+  python3 wakeword-handoff-test.py --wake hey_jarvis.wav --gap 2.5 --keep
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+from bench_common import PYTHON_DIR
+
+RATE = 16000
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise SystemExit(f"{path} must be 16 kHz mono 16-bit")
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+
+def write_wav(path, samples):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.astype(np.int16).tobytes())
+
+
+def noise(rng, seconds, level=30):
+    return rng.normal(0, level, int(seconds * RATE))
+
+
+def speech(seconds):
+    # A few harmonics with a syllable-rate envelope, loud enough for any speech threshold
+    t = np.arange(int(seconds * RATE)) / RATE
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6))
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return 4000 * voice * envelope
+
+
+def frame_rms(samples, frame=320):
+    samples = samples[:len(samples) // frame * frame].astype(np.float32).reshape(-1, frame)
+    return np.sqrt((samples ** 2).mean(axis=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wake", help="16 kHz mono WAV of the wake word")
+    parser.add_argument("--gap", type=float, default=1.5, help="seconds between the wake word and the question")
+    parser.add_argument("--speech", type=float, default=1.5, help="seconds of speech")
+    parser.add_argument("--keep", action="store_true", help="keep the generated and handed-off files")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    wake = read_wav(args.wake) if args.wake else rng.uniform(-20000, 20000, int(0.25 * RATE))
+    parts = [noise(rng, 1.0), wake, noise(rng, args.gap), speech(args.speech), noise(rng, 3.0)]
+    speech_start = sum(len(part) for part in parts[:3])
+
+    workdir = tempfile.mkdtemp(prefix="wake-handoff-")
+    input_path = os.path.join(workdir, "input.wav")
+    write_wav(input_path, np.clip(np.concatenate(parts), -32768, 32767))
+
+    env = dict(os.environ,
+               WAKE_WORD_AUDIO_SOURCE=f"file:{input_path}",
+               WHISPLAY_AUDIO_FILE_REALTIME="false",
+               WAKE_WORD_HANDOFF="true",
+               WAKE_WORD_HANDOFF_DIR=workdir)
+    result = subprocess.run([sys.executable, os.path.join(PYTHON_DIR, "wakeword.py")],
+                            env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=120)
+    wake_lines = [line.split() for line in result.stdout.splitlines() if line.startswith("WAKE ")]
+    end_lines = [line.split() for line in result.stdout.splitlines() if line.startswith("WAKE_AUDIO_END")]
+    if not wake_lines or len(wake_lines[0]) < 4:
+        print(result.stdout + result.stderr)
+        raise SystemExit("FAIL: wake word not detected (or handoff disabled)")
+    handoff_path = wake_lines[0][3]
+    if not end_lines:
+        raise SystemExit("FAIL: handoff never finished")
+
+    handoff = read_wav(handoff_path)
+    print(f"Wake: {' '.join(wake_lines[0][1:3])}, handoff {len(handoff) * 1000 // RATE} ms")
+    # The handoff opens with the end of the wake word (the pre-roll); after that the
+    # speech must be there, loud, for most of its length
+    preroll = int(float(os.getenv("WAKE_WORD_HANDOFF_PREROLL_MS", "300")) * RATE / 1000)
+    speech_rms = frame_rms(speech(args.speech))
+    loud = frame_rms(handoff[preroll:]) > speech_rms.min() * 0.5
+    heard_ms = int(loud.sum()) * 20
+    expected_ms = int(args.speech * 1000)
+    print(f"Speech in handoff: {heard_ms} of {expected_ms} ms")
+
+    if not args.keep:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+    else:
+        print(f"Files kept in {workdir} (speech starts {speech_start * 1000 // RATE} ms into input.wav)")
+
+    if heard_ms < expected_ms * 0.9:
+        raise SystemExit("FAIL: the question after the wake word is missing from the handoff")
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
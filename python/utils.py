@@ -88,19 +88,43 @@ class ImageUtils:
   
   @staticmethod
   def convertCameraFrameToRGB565(frame: np.ndarray, width: int, height: int):
-    # Resize frame to fit the display
-    if cv is not None:
-      frame = cv.resize(frame, (width, height), interpolation=cv.INTER_NEAREST)
-    else:
-      pil_img = Image.fromarray(frame)
-      pil_img = pil_img.resize((width, height), Image.NEAREST)
-      frame = np.array(pil_img)
-    # Convert to RGB565
-    r = (frame[:, :, 0] >> 3).astype(np.uint16)  # 5 bit
-    g = (frame[:, :, 1] >> 2).astype(np.uint16)  # 6 bit
-    b = (frame[:, :, 2] >> 3).astype(np.uint16)  # 5 bit
-    rgb565_data = (r << 11) | (g << 5) | b
-    return rgb565_data.byteswap().tobytes()
+    # Resize frame to fit the display, skipped when the ISP already scaled it
+    if frame.shape[0] != height or frame.shape[1] != width:
+      if cv is not None:
+        frame = cv.resize(frame, (width, height), interpolation=cv.INTER_NEAREST)
+      else:
+        pil_img = Image.fromarray(frame)
+        pil_img = pil_img.resize((width, height), Image.NEAREST)
+        frame = np.array(pil_img)
+    # Pack big-endian RGB565 bytes directly with uint8 operations (no uint16 temporaries or byteswap)
+    r = frame[:, :, 0]
+    g = frame[:, :, 1]
+    b = frame[:, :, 2]
+    out = np.empty((height, width, 2), dtype=np.uint8)
+    np.bitwise_or(r & 0xF8, g >> 5, out=out[:, :, 0])
+    np.bitwise_or((g << 3) & 0xE0, b >> 3, out=out[:, :, 1])
+    return out.tobytes()
+
+  @staticmethod
+  def rgb565_frame_view(frame: np.ndarray, width: int, height: int) -> memoryview:
+    """Flat byte view of a native RGB565 camera frame (little-endian pixels),
+    without copying unless the rows are padded"""
+    if frame.dtype != np.uint8:
+      frame = frame.view(np.uint8).reshape(frame.shape[0], -1)
+    frame = frame[:height, :width * 2]
+    if not frame.flags.c_contiguous:
+      frame = np.ascontiguousarray(frame)
+    return memoryview(frame).cast("B")
+
+  @staticmethod
+  def rgb565_frame_to_rgb888(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Expand a native (little-endian) RGB565 camera frame to an RGB888 array"""
+    pixels = np.frombuffer(ImageUtils.rgb565_frame_view(frame, width, height), dtype="<u2").reshape(height, width)
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    rgb[:, :, 0] = (pixels >> 8) & 0xF8
+    rgb[:, :, 1] = (pixels >> 3) & 0xFC
+    rgb[:, :, 2] = (pixels << 3) & 0xF8
+    return rgb
   
   @staticmethod
   def crop_center(image: Image.Image, target_width: int, target_height: int) -> Image.Image:
@@ -2,8 +2,13 @@ import os
 import sys
 import time
 import signal
-import subprocess
+import tempfile
+import threading
+import wave
 import numpy as np
+from collections import deque
+
+from audio_capture import SAMPLE_RATE, open_source
 
 try:
     from openwakeword.model import Model
@@ -16,12 +21,263 @@ def parse_list(value: str):
     return [item.strip() for item in value.split(",") if item.strip()]
 
 
+class FrameAccumulator:
+    """Collects source blocks of any size and hands out exact model frames.
+
+    Nothing is dropped: a block that does not fill a frame stays buffered
+    until the next one arrives, so the model always sees contiguous audio.
+    """
+
+    def __init__(self, frame_samples=1280):
+        self.frame_samples = frame_samples
+        self._buffer = np.zeros(frame_samples * 4, dtype=np.int16)
+        self._length = 0
+
+    def push(self, chunk):
+        needed = self._length + len(chunk)
+        if needed > len(self._buffer):
+            grown = np.zeros(max(needed, len(self._buffer) * 2), dtype=np.int16)
+            grown[:self._length] = self._buffer[:self._length]
+            self._buffer = grown
+        self._buffer[self._length:needed] = chunk
+        self._length = needed
+
+    def frames(self):
+        """Yield every complete frame. Each frame is a view into the buffer,
+        valid until the next frame is requested."""
+        offset = 0
+        while self._length - offset >= self.frame_samples:
+            yield self._buffer[offset:offset + self.frame_samples]
+            offset += self.frame_samples
+        if offset:
+            remaining = self._length - offset
+            self._buffer[:remaining] = self._buffer[offset:self._length]
+            self._length = remaining
+
+
+class EnergyGate:
+    """Skips Model.predict while the room is quiet.
+
+    Each frame costs one dot product (RMS) and one small FFT (spectral flux,
+    the relative rise in magnitude since the previous frame). A frame is
+    active when its RMS is `ratio` times above the tracked noise floor (and
+    above min_rms), or when the flux shows an onset. Once active the gate
+    stays open for the hangover so the model can finish scoring a word.
+
+    Skipped frames are kept in a lookback queue and replayed when the gate
+    opens, so the model hears the start of the word. If more frames were
+    skipped than the lookback holds, the audio the model sees is no longer
+    contiguous and process() asks the caller to reset the model's streaming
+    state before replaying.
+    """
+
+    def __init__(self, frame_samples=1280, ratio=3.0, min_rms=100.0, flux_threshold=1.0,
+                 hangover_ms=1500, lookback_ms=1000, rate=SAMPLE_RATE):
+        frame_ms = frame_samples * 1000 / rate
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.flux_threshold = flux_threshold
+        self.hangover_frames = int(round(hangover_ms / frame_ms))
+        self.noise_floor = None
+        self.frames_total = 0
+        self.frames_gated = 0
+        self.gate_seconds = 0.0
+        self._open_frames = 0
+        self._skipped_run = 0
+        self._lookback = deque(maxlen=max(0, int(round(lookback_ms / frame_ms))))
+        self._previous_spectrum = None
+
+    @property
+    def lookback_frames(self):
+        """Frames replayed ahead of the frame that opens the gate"""
+        return self._lookback.maxlen
+
+    def threshold(self):
+        return max(self.min_rms, (self.noise_floor or 0.0) * self.ratio)
+
+    def process(self, frame):
+        """Return (frames_to_predict, reset_model)"""
+        started = time.perf_counter()
+        samples = frame.astype(np.float32)
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        spectrum = np.abs(np.fft.rfft(samples))
+        flux = 0.0
+        if self._previous_spectrum is not None:
+            flux = float(np.maximum(spectrum - self._previous_spectrum, 0).sum() /
+                         (self._previous_spectrum.sum() + 1e-6))
+        self._previous_spectrum = spectrum
+
+        active = rms > self.threshold() or (flux > self.flux_threshold and rms > self.min_rms)
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        elif not active:
+            # Falls quickly when the room gets quieter, rises slowly so speech does not raise it
+            rate = 0.2 if rms < self.noise_floor else 0.01
+            self.noise_floor += (rms - self.noise_floor) * rate
+
+        self.frames_total += 1
+        if active:
+            self._open_frames = self.hangover_frames
+        elif self._open_frames > 0:
+            self._open_frames -= 1
+            active = True
+
+        if not active:
+            self.frames_gated += 1
+            self._skipped_run += 1
+            self._lookback.append(frame.copy())
+            self.gate_seconds += time.perf_counter() - started
+            return [], False
+
+        frames = [frame]
+        reset = False
+        if self._skipped_run:
+            # The replayed lookback is not counted as gated any more
+            self.frames_gated -= len(self._lookback)
+            reset = self._skipped_run > len(self._lookback)
+            frames = list(self._lookback) + frames
+            self._lookback.clear()
+            self._skipped_run = 0
+        self.gate_seconds += time.perf_counter() - started
+        return frames, reset
+
+    def reset(self):
+        """Forget buffered audio after a pause; the noise floor is kept"""
+        self._open_frames = 0
+        self._skipped_run = 0
+        self._lookback.clear()
+        self._previous_spectrum = None
+
+    def gated_fraction(self):
+        return self.frames_gated / self.frames_total if self.frames_total else 0.0
+
+
+class WakeAudioHandoff:
+    """Streams the audio that follows a wake word into a WAV file.
+
+    The file starts with the pre-roll taken from the rolling history and
+    grows frame by frame; the WAV header is rewritten on every write, so the
+    file is valid at any point while it streams. Only frames passed to feed()
+    are listened to: recording ends once speech was heard and then
+    `silence_ms` of quiet followed, after `no_speech_sec` without any speech,
+    or after max_sec. Muted samples (the wake chime) are written as silence.
+    """
+
+    def __init__(self, path, speech_threshold, silence_ms=700, max_sec=60, no_speech_sec=5,
+                 rate=SAMPLE_RATE):
+        self.path = path
+        self.speech_threshold = speech_threshold
+        self.rate = rate
+        self.silence_samples = int(silence_ms * rate / 1000)
+        self.max_samples = int(max_sec * rate)
+        self.no_speech_samples = int(no_speech_sec * rate)
+        self.samples_written = 0
+        self.speech_heard = False
+        self._quiet_samples = 0
+        self._mute_samples = 0
+        self._file = open(path, "wb")
+        self._wav = wave.open(self._file, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(rate)
+
+    def _write(self, frame):
+        self._wav.writeframes(frame.tobytes())
+        self._file.flush()
+        self.samples_written += len(frame)
+
+    def preroll(self, frame):
+        """Append audio from before the wake word ended; it is not listened to"""
+        self._write(frame)
+
+    def mute(self, samples):
+        """Write the next `samples` fed as silence and ignore them"""
+        self._mute_samples = samples
+
+    def feed(self, frame):
+        """Append one frame. Returns True once the recording is finished."""
+        if self._mute_samples > 0:
+            self._mute_samples -= len(frame)
+            self._write(np.zeros_like(frame))
+            return self.samples_written >= self.max_samples
+        self._write(frame)
+        samples = frame.astype(np.float32)
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        if rms > self.speech_threshold():
+            self.speech_heard = True
+            self._quiet_samples = 0
+        else:
+            self._quiet_samples += len(frame)
+        if self.speech_heard:
+            return self.samples_written >= self.max_samples or self._quiet_samples >= self.silence_samples
+        return self.samples_written >= self.max_samples or self._quiet_samples >= self.no_speech_samples
+
+    def duration_ms(self):
+        return int(self.samples_written * 1000 / self.rate)
+
+    def close(self):
+        self._wav.close()
+        self._file.close()
+
+
+class ControlChannel:
+    """Reads PAUSE / RESUME / RESET commands, one per line, from stdin.
+
+    Commands are queued by a reader thread and applied by the audio loop
+    between frames, so model state is only ever touched from one thread.
+    EOF (stdin closed or not connected) just ends the reader.
+    """
+
+    COMMANDS = ("PAUSE", "RESUME", "RESET")
+
+    def __init__(self, stream=sys.stdin):
+        self._stream = stream
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="WakeWordControl", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for line in self._stream:
+            command = line.strip().upper()
+            if not command:
+                continue
+            if command not in self.COMMANDS:
+                print(f"[WakeWord] Unknown command: {command}", flush=True)
+                continue
+            with self._lock:
+                self._pending.append(command)
+
+    def poll(self):
+        """Return the commands received since the last call"""
+        with self._lock:
+            commands = list(self._pending)
+            self._pending.clear()
+        return commands
+
+
 def main():
     wake_words = parse_list(os.getenv("WAKE_WORDS", ""))
     model_paths = parse_list(os.getenv("WAKE_WORD_MODEL_PATHS", ""))
     threshold = float(os.getenv("WAKE_WORD_THRESHOLD", "0.5"))
     cooldown_sec = float(os.getenv("WAKE_WORD_COOLDOWN_SEC", "1.5"))
     alsa_input_device = os.getenv("ALSA_INPUT_DEVICE", "default")
+    # "alsa:<device>", "file:<path.wav|path.raw>" or "ring:<name>" (see audio_capture.py)
+    source_spec = os.getenv("WAKE_WORD_AUDIO_SOURCE", f"alsa:{alsa_input_device}")
+    period_size = int(os.getenv("WAKE_WORD_PERIOD_SIZE", "1280"))
+    gate_enabled = os.getenv("WAKE_WORD_GATE", "true").lower() == "true"
+    gate_report_sec = float(os.getenv("WAKE_WORD_GATE_REPORT_SEC", "300"))
+    # Hand the audio after the wake word to the ASR side instead of letting it start a new recording
+    handoff_enabled = os.getenv("WAKE_WORD_HANDOFF", "true").lower() == "true"
+    handoff_dir = os.getenv("WAKE_WORD_HANDOFF_DIR", tempfile.gettempdir())
+    handoff_preroll_ms = float(os.getenv("WAKE_WORD_HANDOFF_PREROLL_MS", "300"))
+    handoff_silence_ms = float(os.getenv("WAKE_WORD_HANDOFF_SILENCE_MS", "700"))
+    # Give up when nothing is said after the wake word
+    handoff_no_speech_sec = float(os.getenv("WAKE_WORD_HANDOFF_NO_SPEECH_SEC", "5"))
+    # The wake chime (ChatFlow plays it on WAKE) is muted in the handoff instead of being taken for speech
+    handoff_chime_ms = float(os.getenv("WAKE_WORD_HANDOFF_CHIME_MS", "600"))
+    handoff_max_sec = float(os.getenv("WAKE_WORD_RECORD_MAX_SEC", "60"))
+    history_sec = float(os.getenv("WAKE_WORD_HISTORY_SEC", "3"))
 
     if not wake_words and not model_paths:
         wake_words = ["hey_jarvis"]
@@ -34,33 +290,91 @@ def main():
         print(f"[WakeWord] Failed to initialize model: {e}", file=sys.stderr)
         sys.exit(1)
 
-    sox_cmd = [
-        "sox",
-        "-t",
-        "alsa",
-        alsa_input_device,
-        "-r",
-        "16000",
-        "-b",
-        "16",
-        "-e",
-        "signed-integer",
-        "-c",
-        "1",
-        "-t",
-        "raw",
-        "-",
-    ]
-
-    process = subprocess.Popen(
-        sox_cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-    )
+    try:
+        source = open_source(source_spec, chunk_samples=period_size)
+    except Exception as e:
+        print(f"[WakeWord] Failed to open audio source {source_spec}: {e}", file=sys.stderr)
+        sys.exit(1)
+    if source.rate != SAMPLE_RATE:
+        print(f"[WakeWord] Audio source must be {SAMPLE_RATE} Hz, got {source.rate}", file=sys.stderr)
+        sys.exit(1)
+
+    gate = None
+    if gate_enabled:
+        gate = EnergyGate(
+            ratio=float(os.getenv("WAKE_WORD_GATE_RATIO", "3.0")),
+            min_rms=float(os.getenv("WAKE_WORD_GATE_MIN_RMS", "100")),
+            flux_threshold=float(os.getenv("WAKE_WORD_GATE_FLUX", "1.0")),
+            hangover_ms=float(os.getenv("WAKE_WORD_GATE_HANGOVER_MS", "1500")),
+            lookback_ms=float(os.getenv("WAKE_WORD_GATE_LOOKBACK_MS", "1000")),
+        )
+    predict_count = 0
+    predict_seconds = 0.0
+
+    def report_gate():
+        if gate is None or not gate.frames_total:
+            return
+        average_predict = predict_seconds / predict_count if predict_count else 0.0
+        saved_ms = (gate.frames_gated * average_predict - gate.gate_seconds) * 1000
+        print(f"[WakeWord] Gate: {gate.gated_fraction() * 100:.1f}% of {gate.frames_total} frames skipped, "
+              f"~{saved_ms:.0f} ms CPU saved (predict {average_predict * 1000:.2f} ms/frame), "
+              f"noise floor {gate.noise_floor:.0f}, threshold {gate.threshold():.0f}, "
+              f"lookback {gate.lookback_frames} frames", flush=True)
+
+    frame_ms = 1280 * 1000 / SAMPLE_RATE
+    preroll_frames = int(round(handoff_preroll_ms / frame_ms))
+    # Rolling PCM history, long enough to cover the pre-roll even when the
+    # wake word is found in frames the gate replays from its lookback
+    history_frames = int(round(history_sec * 1000 / frame_ms)) + preroll_frames
+    if gate is not None:
+        history_frames += gate.lookback_frames
+    history = deque(maxlen=history_frames)
+    frame_index = -1
+    handoff = None
+    handoff_path = None
+    min_rms = float(os.getenv("WAKE_WORD_GATE_MIN_RMS", "100"))
+
+    def speech_threshold():
+        return gate.threshold() if gate is not None else min_rms
+
+    def finish_handoff():
+        nonlocal handoff
+        handoff.close()
+        print(f"WAKE_AUDIO_END {handoff.path} {handoff.duration_ms()}", flush=True)
+        handoff = None
+
+    def start_handoff(detected_index):
+        """Open a handoff file starting preroll_frames before the end of the detected frame.
+
+        Frames up to the detected one hold the wake word and are only written;
+        everything after it until the chime has played is muted.
+        """
+        nonlocal handoff, handoff_path
+        if handoff_path and os.path.exists(handoff_path):
+            # The previous session's file has been recognized by now
+            os.remove(handoff_path)
+        handoff_path = os.path.join(handoff_dir, f"wake-{int(time.time() * 1000)}.wav")
+        handoff = WakeAudioHandoff(handoff_path, speech_threshold, handoff_silence_ms, handoff_max_sec,
+                                   handoff_no_speech_sec)
+        handoff.mute((frame_index - detected_index) * 1280 + int(handoff_chime_ms * SAMPLE_RATE / 1000))
+        first_index = detected_index + 1 - preroll_frames
+        oldest_index = frame_index - len(history) + 1
+        for index, past_frame in enumerate(history, start=oldest_index):
+            if index < first_index:
+                continue
+            if index <= detected_index:
+                handoff.preroll(past_frame)
+            elif handoff.feed(past_frame):
+                finish_handoff()
+                break
+        return handoff_path
 
     def cleanup(*_):
+        if handoff is not None:
+            finish_handoff()
+        report_gate()
         try:
-            process.terminate()
+            source.close()
         except Exception:
             pass
         sys.exit(0)
@@ -69,35 +383,77 @@ def main():
     signal.signal(signal.SIGINT, cleanup)
 
     last_trigger = 0.0
-    chunk_samples = 1280
-    chunk_bytes = chunk_samples * 2
+    accumulator = FrameAccumulator(1280)
+    control = ControlChannel()
+    paused = False
+
+    def reset_model():
+        if hasattr(model, "reset"):
+            model.reset()
+        if gate is not None:
+            gate.reset()
+    last_gate_report = time.monotonic()
 
+    print(f"[WakeWord] Audio source: {source_spec} ({period_size} samples per read)")
     print("[WakeWord] READY", flush=True)
 
     while True:
-        if process.stdout is None:
-            time.sleep(0.1)
-            continue
-        data = process.stdout.read(chunk_bytes)
-        if not data or len(data) < chunk_bytes:
-            time.sleep(0.01)
-            continue
-
-        audio = np.frombuffer(data, dtype=np.int16)
-        try:
-            prediction = model.predict(audio)
-        except Exception:
-            continue
+        chunk = source.read()
+        if chunk is None:
+            print("[WakeWord] Audio source finished", flush=True)
+            cleanup()
+        for command in control.poll():
+            if command == "PAUSE":
+                paused = True
+            elif command == "RESUME":
+                # Predictions buffered before the pause describe old audio
+                paused = False
+                reset_model()
+            elif command == "RESET":
+                reset_model()
+            print(f"[WakeWord] {command} ({'paused' if paused else 'listening'})", flush=True)
+        accumulator.push(chunk)
+        for frame in accumulator.frames():
+            frame_index += 1
+            if handoff_enabled:
+                history.append(frame.copy())
+                if handoff is not None and handoff.feed(frame):
+                    finish_handoff()
+            if paused:
+                # Keep draining the device (and any handoff) but run no model
+                continue
+            frames = [frame]
+            if gate is not None:
+                frames, reset = gate.process(frame)
+                if reset and hasattr(model, "reset"):
+                    model.reset()
+            for offset, model_frame in enumerate(frames):
+                started = time.perf_counter()
+                try:
+                    prediction = model.predict(model_frame)
+                except Exception:
+                    continue
+                predict_seconds += time.perf_counter() - started
+                predict_count += 1
 
-        now = time.time()
-        if now - last_trigger < cooldown_sec:
-            continue
+                now = time.time()
+                if now - last_trigger < cooldown_sec:
+                    continue
 
-        for keyword, score in prediction.items():
-            if score >= threshold:
-                last_trigger = now
-                print(f"WAKE {keyword} {score:.3f}", flush=True)
-                break
+                for keyword, score in prediction.items():
+                    if score >= threshold:
+                        last_trigger = now
+                        if handoff_enabled and handoff is None:
+                            # Replayed lookback frames are older than the live frame
+                            detected_index = frame_index - (len(frames) - 1 - offset)
+                            path = start_handoff(detected_index)
+                            print(f"WAKE {keyword} {score:.3f} {path}", flush=True)
+                        else:
+                            print(f"WAKE {keyword} {score:.3f}", flush=True)
+                        break
+        if gate is not None and time.monotonic() - last_gate_report >= gate_report_sec:
+            last_gate_report = time.monotonic()
+            report_gate()
 
 
 if __name__ == "__main__":
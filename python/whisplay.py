@@ -1,6 +1,17 @@
-import spidev
+import os
+import json
+import select
 import time
 import threading
+from collections import deque
+
+try:
+    import spidev
+except ImportError:
+    spidev = None
+
+from led_animation import LedAnimator
+from whisplay_emulator import EmulatedPWM, EmulatedSpiDev, ST7789Emulator
 
 
 # ==================== Platform Detection ====================
@@ -37,11 +48,9 @@ else:
             PLATFORM = "radxa"
             PLATFORM_MODEL = "Unknown Radxa"
         except ImportError:
-            raise RuntimeError(
-                "No supported GPIO library found.\n"
-                "Raspberry Pi: pip install RPi.GPIO\n"
-                "Radxa: sudo apt install python3-libgpiod"
-            )
+            # Keep the module importable off-device (NullWhisplayBoard),
+            # WhisplayBoard() reports the missing library when instantiated.
+            pass
 
 
 # ==================== Radxa Zero 3W Pin Mapping ====================
@@ -58,52 +67,180 @@ RADXA_ZERO3_PIN_MAP = {
 }
 
 
+# ==================== SPI Calibration ====================
+# Candidate SPI clocks tried by WhisplayBoard.calibrate_spi, never above the default
+SPI_SPEED_CANDIDATES = {
+    "rpi": [100_000_000, 80_000_000, 62_500_000, 50_000_000, 32_000_000],
+    "radxa": [48_000_000, 37_500_000, 25_000_000, 16_000_000],
+    "emulator": [100_000_000, 50_000_000],
+}
+# None means a single writebytes2 call per buffer
+SPI_CHUNK_CANDIDATES = [None, 4096, 16384, 65536]
+SPI_CALIBRATION_FILE = os.getenv(
+    "WHISPLAY_SPI_CALIBRATION_FILE",
+    os.path.join(os.path.expanduser("~"), ".cache", "whisplay", "spi-calibration.json"),
+)
+
+
 # ==================== Software PWM ====================
+class SoftPWMScheduler:
+    """Drives every software PWM channel from one thread and one timeline.
+
+    Each active channel keeps the time of its next edge; the thread sleeps
+    until the earliest one, toggles every channel that is due and sleeps
+    again. Channels at 0% or 100% duty are written once and then dropped from
+    the timeline, so a board whose LEDs are off or fully on causes no wakeups.
+    The delay between a scheduled edge and the actual GPIO write is recorded
+    as jitter (see stats()).
+    """
+
+    def __init__(self, jitter_samples=2048):
+        self._channels = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.edges = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        self.recent_jitter = deque(maxlen=jitter_samples)
+
+    def add(self, channel):
+        with self._cond:
+            if channel not in self._channels:
+                self._channels.append(channel)
+            self._reschedule_locked(channel)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="SoftPWM", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def remove(self, channel):
+        with self._cond:
+            if channel in self._channels:
+                self._channels.remove(channel)
+            self._cond.notify()
+
+    def update(self, channel):
+        """Apply a duty cycle change; constant levels are written right away"""
+        with self._cond:
+            if channel in self._channels:
+                self._reschedule_locked(channel)
+                self._cond.notify()
+
+    def _reschedule_locked(self, channel):
+        duty_cycle = channel.duty_cycle
+        if duty_cycle <= 0 or duty_cycle >= 100:
+            channel.next_edge = None
+            channel.write(1 if duty_cycle >= 100 else 0)
+        elif channel.next_edge is None:
+            # Start a new period now, the first edge turns the output on
+            channel.period_start = time.monotonic()
+            channel.next_edge = channel.period_start
+            channel.level = 0
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due = None
+                for channel in self._channels:
+                    if channel.next_edge is not None and (due is None or channel.next_edge < due):
+                        due = channel.next_edge
+                if due is None:
+                    # Nothing is toggling, sleep until a duty cycle changes
+                    self._cond.wait()
+                    continue
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                for channel in self._channels:
+                    if channel.next_edge is not None and channel.next_edge <= now:
+                        self._record_jitter(now - channel.next_edge)
+                        self._step_locked(channel, now)
+
+    def _step_locked(self, channel, now):
+        period = 1.0 / channel.frequency
+        if channel.level == 0:
+            channel.write(1)
+            channel.next_edge = channel.period_start + period * channel.duty_cycle / 100.0
+        else:
+            channel.write(0)
+            channel.period_start += period
+            if now - channel.period_start > period:
+                # Fell more than a period behind (e.g. the process was stopped), resync
+                channel.period_start = now
+            channel.next_edge = channel.period_start
+
+    def _record_jitter(self, lateness):
+        self.edges += 1
+        self.jitter_total += lateness
+        self.jitter_max = max(self.jitter_max, lateness)
+        self.recent_jitter.append(lateness)
+
+    def stats(self):
+        """Edge count and how late edges were written, in microseconds"""
+        with self._cond:
+            recent = sorted(self.recent_jitter)
+            active = sum(1 for channel in self._channels if channel.next_edge is not None)
+            channels = len(self._channels)
+        if not recent:
+            return {"channels": channels, "active_channels": active, "edges": self.edges}
+        return {
+            "channels": channels,
+            "active_channels": active,
+            "edges": self.edges,
+            "avg_jitter_us": round(self.jitter_total / self.edges * 1e6, 1),
+            "max_jitter_us": round(self.jitter_max * 1e6, 1),
+            "p50_jitter_us": round(recent[len(recent) // 2] * 1e6, 1),
+            "p99_jitter_us": round(recent[min(len(recent) - 1, int(len(recent) * 0.99))] * 1e6, 1),
+        }
+
+
+_soft_pwm_scheduler = None
+
+
+def get_soft_pwm_scheduler():
+    """The process-wide scheduler shared by every SoftPWM channel"""
+    global _soft_pwm_scheduler
+    if _soft_pwm_scheduler is None:
+        _soft_pwm_scheduler = SoftPWMScheduler()
+    return _soft_pwm_scheduler
+
+
 class SoftPWM:
-    """Software PWM implementation for GPIO platforms without hardware PWM support"""
+    """Software PWM implementation for GPIO platforms without hardware PWM support.
+    Same interface as RPi.GPIO.PWM; the toggling is done by the shared SoftPWMScheduler.
+    """
 
-    def __init__(self, set_value_func, frequency=100):
+    def __init__(self, set_value_func, frequency=100, scheduler=None):
         self._set_value = set_value_func
         self.frequency = frequency
         self.duty_cycle = 0.0
-        self._running = False
-        self._thread = None
+        self.scheduler = scheduler or get_soft_pwm_scheduler()
+        self.next_edge = None
+        self.period_start = 0.0
+        self.level = None
+
+    def write(self, value):
+        if value != self.level:
+            self._set_value(value)
+            self.level = value
 
     def start(self, duty_cycle=0):
-        self.duty_cycle = float(duty_cycle)
-        self._running = True
-        self._thread = threading.Thread(target=self._pwm_loop, daemon=True)
-        self._thread.start()
+        self.duty_cycle = max(0.0, min(100.0, float(duty_cycle)))
+        self.scheduler.add(self)
 
     def ChangeDutyCycle(self, duty_cycle):
         self.duty_cycle = max(0.0, min(100.0, float(duty_cycle)))
+        self.scheduler.update(self)
 
     def stop(self):
-        self._running = False
-        if self._thread:
-            self._thread.join(timeout=1)
+        self.scheduler.remove(self)
+        self.next_edge = None
         try:
             self._set_value(0)
         except Exception:
             pass
-
-    def _pwm_loop(self):
-        while self._running:
-            period = 1.0 / self.frequency
-            dc = self.duty_cycle
-            if dc <= 0:
-                self._set_value(0)
-                time.sleep(period)
-            elif dc >= 100:
-                self._set_value(1)
-                time.sleep(period)
-            else:
-                on_time = period * dc / 100.0
-                off_time = period - on_time
-                self._set_value(1)
-                time.sleep(on_time)
-                self._set_value(0)
-                time.sleep(off_time)
+        self.level = 0
 
 
 class WhisplayBoard:
@@ -124,30 +261,55 @@ class WhisplayBoard:
 
     # Button pin
     BUTTON_PIN = 11
+    BUTTON_DEBOUNCE_MS = 50
 
-    def __init__(self):
-        self.platform = PLATFORM
+    def __init__(self, backend=None, emulator_options=None):
+        """
+        :param backend: None to use the detected platform, or "emulator" for the
+                        headless ST7789 emulator (see whisplay_emulator.py)
+        :param emulator_options: keyword arguments for _init_emulator
+        """
+        self.platform = backend or PLATFORM
         self.backlight_pwm = None
         self._current_r = 0
         self._current_g = 0
         self._current_b = 0
         self.button_press_callback = None
         self.button_release_callback = None
+        self.last_button_event_time = None
+        self.platform_model = "Emulator" if self.platform == "emulator" else PLATFORM_MODEL
+        self.spi_chunk_size = None
+        # Held for every command + data sequence (window write, sleep, byte order) so the
+        # render, power and camera threads never interleave on the bus. Reentrant, callers
+        # may hold it across several draws, e.g. to switch the byte order around one.
+        self.spi_lock = threading.RLock()
+        self._reset_spi_stats()
 
         if self.platform == "rpi":
             self._init_rpi()
         elif self.platform == "radxa":
             self._init_radxa()
+        elif self.platform == "emulator":
+            self._init_emulator(**(emulator_options or {}))
         else:
-            raise RuntimeError(f"Unsupported platform: {self.platform}")
+            raise RuntimeError(
+                "No supported GPIO library found.\n"
+                "Raspberry Pi: pip install RPi.GPIO\n"
+                "Radxa: sudo apt install python3-libgpiod"
+            )
 
+        self.led = LedAnimator(self._apply_rgb)
         self.previous_frame = None
         # Detect hardware version and set backlight mode
         self._detect_hardware_version()
-        self._detect_wm8960()
+        if self.platform != "emulator":
+            self._detect_wm8960()
         self.set_backlight(0)
+        self._load_spi_calibration()
         self._reset_lcd()
         self._init_display()
+        if os.getenv("WHISPLAY_SPI_CALIBRATE", "false").lower() == "true":
+            self.calibrate_spi()
         self.fill_screen(0)
 
     # ==================== Raspberry Pi Initialization ====================
@@ -223,27 +385,37 @@ class WhisplayBoard:
         self.green_pwm.start(0)
         self.blue_pwm.start(0)
 
-        # Initialize button (input with pull-up, polled for state changes)
+        # Initialize button (input with pull-up, edge events on both edges)
         chip_num, line_offset = pin_map[self.BUTTON_PIN]
         chip = self._gpio_chips[chip_num]
         btn_line = chip.get_line(line_offset)
+        btn_monitor = self._button_events_radxa
         try:
             btn_line.request(
                 consumer='whisplay-btn',
-                type=gpiod.LINE_REQ_DIR_IN,
+                type=gpiod.LINE_REQ_EV_BOTH_EDGES,
                 flags=gpiod.LINE_REQ_FLAG_BIAS_PULL_UP
             )
         except Exception:
-            # Fallback: no internal pull-up (relies on external pull-up resistor)
-            btn_line.request(
-                consumer='whisplay-btn',
-                type=gpiod.LINE_REQ_DIR_IN
-            )
+            try:
+                # Fallback: no internal pull-up (relies on external pull-up resistor)
+                btn_line.request(
+                    consumer='whisplay-btn',
+                    type=gpiod.LINE_REQ_EV_BOTH_EDGES
+                )
+            except Exception:
+                # Fallback: no edge events on this line, poll the level instead
+                btn_line.request(
+                    consumer='whisplay-btn',
+                    type=gpiod.LINE_REQ_DIR_IN
+                )
+                btn_monitor = self._button_monitor_radxa
         self._gpio_lines[self.BUTTON_PIN] = btn_line
 
         # Start button event listener thread
         self._btn_thread_running = True
-        self._btn_thread = threading.Thread(target=self._button_monitor_radxa, daemon=True)
+        self._btn_wake_r, self._btn_wake_w = os.pipe()
+        self._btn_thread = threading.Thread(target=btn_monitor, daemon=True)
         self._btn_thread.start()
 
         # Initialize SPI (40-pin header on Radxa Zero 3W uses SPI3)
@@ -252,6 +424,85 @@ class WhisplayBoard:
         self.spi.max_speed_hz = 48_000_000  # RK3566 SPI max 50MHz
         self.spi.mode = 0b00
 
+    # ==================== Emulator Initialization ====================
+    def _init_emulator(self, realtime_spi=False, framebuffer_path=None, max_speed_hz=100_000_000):
+        """Headless backend: SPI goes to an ST7789 emulator, GPIO and PWM are recorded"""
+        self._emulated_pins = {}
+        self.emulator = ST7789Emulator(
+            offset=(0, 20), size=(self.LCD_WIDTH, self.LCD_HEIGHT), framebuffer_path=framebuffer_path
+        )
+
+        self.red_pwm = EmulatedPWM(100)
+        self.green_pwm = EmulatedPWM(100)
+        self.blue_pwm = EmulatedPWM(100)
+        self.red_pwm.start(0)
+        self.green_pwm.start(0)
+        self.blue_pwm.start(0)
+
+        self.spi = EmulatedSpiDev(self.emulator, realtime=realtime_spi)
+        self.spi.max_speed_hz = max_speed_hz
+        self.spi.mode = 0b00
+
+    def emulate_button(self, pressed):
+        """Inject a button press/release on the emulator backend"""
+        self._emulated_pins[self.BUTTON_PIN] = 1 if pressed else 0
+        if pressed:
+            self._button_press_event(self.BUTTON_PIN)
+        else:
+            self._button_release_event(self.BUTTON_PIN)
+
+    def _button_events_radxa(self):
+        """Button edge event thread for Radxa platform.
+        Blocks in select() on the line's event fd, so an idle button costs no
+        wakeups. HIGH (1) = pressed, LOW (0) = released (matching RPi behavior).
+        Debounce: the first edge that changes the state is reported at once
+        with its kernel timestamp, further edges within BUTTON_DEBOUNCE_MS
+        are ignored, and once the window has passed the line is re-read in
+        case the final level differs from the last reported state.
+        """
+        btn_line = self._gpio_lines[self.BUTTON_PIN]
+        event_fd = btn_line.event_get_fd()
+        state = btn_line.get_value()
+        last_change = 0.0
+        suppressed = False
+        while self._btn_thread_running:
+            timeout = None
+            if suppressed:
+                timeout = max(0.0, last_change + self.BUTTON_DEBOUNCE_MS / 1000 - time.monotonic())
+            try:
+                readable, _, _ = select.select([event_fd, self._btn_wake_r], [], [], timeout)
+                if self._btn_wake_r in readable or not self._btn_thread_running:
+                    break
+                if event_fd in readable:
+                    event = btn_line.event_read()
+                    timestamp = event.sec + event.nsec / 1e9
+                    if abs(timestamp - time.monotonic()) > 1.0:
+                        # Kernels before 5.7 stamp v1 events with CLOCK_REALTIME
+                        timestamp = time.monotonic()
+                    new_state = 1 if event.type == gpiod.LineEvent.RISING_EDGE else 0
+                    if new_state == state:
+                        continue
+                    if timestamp - last_change < self.BUTTON_DEBOUNCE_MS / 1000:
+                        suppressed = True
+                        continue
+                else:
+                    # Debounce window over, settle on the level the line actually has
+                    suppressed = False
+                    new_state = btn_line.get_value()
+                    timestamp = time.monotonic()
+                    if new_state == state:
+                        continue
+                state = new_state
+                last_change = timestamp
+                if state == 1:
+                    self._button_press_event(self.BUTTON_PIN, timestamp)
+                else:
+                    self._button_release_event(self.BUTTON_PIN, timestamp)
+            except Exception as e:
+                if self._btn_thread_running:
+                    print(f"[Button] Edge event error: {e}")
+                    time.sleep(0.1)
+
     def _button_monitor_radxa(self):
         """Button state polling thread for Radxa platform.
         Reads GPIO value directly (like RPi's GPIO.input), avoiding edge event ambiguity.
@@ -267,12 +518,10 @@ class WhisplayBoard:
                     last_state = state
                     if state == 1:
                         # Button pressed (HIGH)
-                        if self.button_press_callback:
-                            self.button_press_callback()
+                        self._button_press_event(self.BUTTON_PIN)
                     else:
                         # Button released (LOW)
-                        if self.button_release_callback:
-                            self.button_release_callback()
+                        self._button_release_event(self.BUTTON_PIN)
             except Exception:
                 if self._btn_thread_running:
                     pass
@@ -285,6 +534,10 @@ class WhisplayBoard:
             GPIO.output(pin, GPIO.HIGH if value else GPIO.LOW)
         elif self.platform == "radxa":
             self._gpio_lines[pin].set_value(1 if value else 0)
+        elif self.platform == "emulator":
+            self._emulated_pins[pin] = 1 if value else 0
+            if pin == self.DC_PIN:
+                self.emulator.dc = self._emulated_pins[pin]
 
     def _gpio_input(self, pin):
         """Read GPIO pin input value"""
@@ -292,12 +545,14 @@ class WhisplayBoard:
             return GPIO.input(pin)
         elif self.platform == "radxa":
             return self._gpio_lines[pin].get_value()
+        elif self.platform == "emulator":
+            return self._emulated_pins.get(pin, 0)
 
     # ==================== Hardware Detection ====================
     def _detect_hardware_version(self):
         """Detect hardware version and set backlight mode accordingly"""
         try:
-            model = PLATFORM_MODEL
+            model = self.platform_model
             if self.platform == "rpi":
                 if "Zero" in model and "2" not in model:
                     self.backlight_mode = False  # Use simple on/off mode
@@ -340,6 +595,8 @@ class WhisplayBoard:
                 elif self.platform == "radxa":
                     led_line = self._gpio_lines[self.LED_PIN]
                     self.backlight_pwm = SoftPWM(led_line.set_value, 1000)
+                elif self.platform == "emulator":
+                    self.backlight_pwm = EmulatedPWM(1000)
                 self.backlight_pwm.start(100)
             if 0 <= brightness <= 100:
                 duty_cycle = 100 - brightness
@@ -364,6 +621,8 @@ class WhisplayBoard:
             elif self.platform == "radxa":
                 led_line = self._gpio_lines[self.LED_PIN]
                 self.backlight_pwm = SoftPWM(led_line.set_value, 1000)
+            elif self.platform == "emulator":
+                self.backlight_pwm = EmulatedPWM(1000)
             self.backlight_pwm.start(100)
         else:  # Switch to simple on/off mode
             if self.backlight_pwm is not None:
@@ -432,10 +691,45 @@ class WhisplayBoard:
         )
         self._send_command(0x21)
         self._send_command(0x29)
+        self.panel_sleeping = False
+        self.pixel_little_endian = False
+
+    def set_pixel_byte_order(self, little_endian):
+        """RAMCTRL (0xB0) ENDIAN bit: accept little-endian RGB565 pixels, e.g. straight from the camera ISP.
+        Every other draw call expects big-endian, so switch back when done."""
+        with self.spi_lock:
+            if little_endian == self.pixel_little_endian:
+                return
+            self._send_command(0xB0, 0x00, 0xF8 if little_endian else 0xF0)
+            self.pixel_little_endian = little_endian
+
+    def sleep_panel(self):
+        """Display off and sleep-in (0x28, 0x10). The controller keeps its frame memory."""
+        with self.spi_lock:
+            if self.panel_sleeping:
+                return
+            self._send_command(0x28)
+            self._send_command(0x10)
+            # Sleep-in needs 5 ms before the next command
+            time.sleep(0.005)
+            self.panel_sleeping = True
+
+    def wake_panel(self):
+        """Sleep-out and display on (0x11, 0x29)"""
+        with self.spi_lock:
+            if not self.panel_sleeping:
+                return
+            self._send_command(0x11)
+            # 5 ms is enough before writing again; the 120 ms limit only applies to the next sleep-in
+            time.sleep(0.005)
+            self._send_command(0x29)
+            self.panel_sleeping = False
 
     def _send_command(self, cmd, *args):
         self._gpio_output(self.DC_PIN, 0)
+        start = time.perf_counter()
         self.spi.xfer2([cmd])
+        self._record_spi_transfer(1, time.perf_counter() - start)
         if args:
             self._gpio_output(self.DC_PIN, 1)
             self._send_data(list(args))
@@ -443,12 +737,130 @@ class WhisplayBoard:
     def _send_data(self, data):
         self._gpio_output(self.DC_PIN, 1)
         
+        start = time.perf_counter()
+        chunk = self.spi_chunk_size
         try:
-            self.spi.writebytes2(data)
+            if chunk:
+                for i in range(0, len(data), chunk):
+                    self.spi.writebytes2(data[i : i + chunk])
+            else:
+                self.spi.writebytes2(data)
         except AttributeError:
-            max_chunk = 4096
+            max_chunk = min(chunk or 4096, 4096)
             for i in range(0, len(data), max_chunk):
                 self.spi.writebytes(data[i : i + max_chunk])
+        self._record_spi_transfer(len(data), time.perf_counter() - start)
+
+    # ========== SPI Statistics & Calibration ==========
+    def _reset_spi_stats(self):
+        self.spi_bytes = 0
+        self.spi_calls = 0
+        self.spi_time = 0.0
+
+    def _record_spi_transfer(self, length, duration):
+        self.spi_bytes += length
+        self.spi_calls += 1
+        self.spi_time += duration
+
+    def get_spi_stats(self):
+        """Bytes, calls and seconds spent in spidev, plus the effective throughput"""
+        return {
+            "bytes": self.spi_bytes,
+            "calls": self.spi_calls,
+            "seconds": round(self.spi_time, 6),
+            "effective_mb_s": round(self.spi_bytes / self.spi_time / 1e6, 3) if self.spi_time else 0,
+            "max_speed_hz": getattr(getattr(self, "spi", None), "max_speed_hz", None),
+            "chunk_size": self.spi_chunk_size,
+        }
+
+    def get_soft_pwm_stats(self):
+        """Scheduler jitter statistics, None on platforms with hardware PWM"""
+        if _soft_pwm_scheduler is None:
+            return None
+        return _soft_pwm_scheduler.stats()
+
+    def _load_spi_calibration(self):
+        """Apply a previously saved calibration for this platform model, if any"""
+        try:
+            with open(SPI_CALIBRATION_FILE, "r") as f:
+                setting = json.load(f).get(self.platform_model)
+        except (OSError, ValueError):
+            return
+        if not setting:
+            return
+        self.spi.max_speed_hz = setting["max_speed_hz"]
+        self.spi_chunk_size = setting["chunk_size"]
+        print(f"[SPI] Using calibrated setting: {setting['max_speed_hz']} Hz, chunk {setting['chunk_size']}")
+
+    def _save_spi_calibration(self, setting):
+        try:
+            with open(SPI_CALIBRATION_FILE, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        saved[self.platform_model] = setting
+        try:
+            os.makedirs(os.path.dirname(SPI_CALIBRATION_FILE), exist_ok=True)
+            with open(SPI_CALIBRATION_FILE, "w") as f:
+                json.dump(saved, f, indent=2)
+        except OSError as e:
+            print(f"[SPI] Failed to save calibration: {e}")
+
+    def calibrate_spi(self, speeds=None, chunk_sizes=None, repeats=5, save=True):
+        """
+        Time full-screen test pattern writes for each clock rate / chunk size and
+        keep the fastest stable combination. There is no readback on this panel,
+        so a setting counts as stable when every write succeeds and the timings
+        are consistent (max within 1.5x of the median); a clock the controller
+        cannot actually reach shows up as no faster than a lower one.
+        :return: the chosen {"max_speed_hz", "chunk_size", "frame_ms"} setting
+        """
+        speeds = speeds or SPI_SPEED_CANDIDATES.get(self.platform, [self.spi.max_speed_hz])
+        chunk_sizes = chunk_sizes or SPI_CHUNK_CANDIDATES
+        original = (self.spi.max_speed_hz, self.spi_chunk_size)
+        # Alternating stripes so every byte toggles on the bus
+        row = bytes([0xF8, 0x00, 0x07, 0xE0]) * (self.LCD_WIDTH // 2)
+        pattern = (row + row[::-1]) * (self.LCD_HEIGHT // 2)
+
+        # Nothing else may draw while the clock and chunk size are being changed
+        with self.spi_lock:
+            results = []
+            for speed in speeds:
+                for chunk in chunk_sizes:
+                    self.spi.max_speed_hz = speed
+                    self.spi_chunk_size = chunk
+                    timings = []
+                    try:
+                        for _ in range(repeats):
+                            start = time.perf_counter()
+                            self.draw_image(0, 0, self.LCD_WIDTH, self.LCD_HEIGHT, pattern)
+                            timings.append(time.perf_counter() - start)
+                    except Exception as e:
+                        print(f"[SPI] {speed} Hz, chunk {chunk}: failed ({e})")
+                        continue
+                    timings.sort()
+                    median = timings[len(timings) // 2]
+                    stable = timings[-1] <= median * 1.5
+                    print(f"[SPI] {speed} Hz, chunk {chunk}: {median * 1000:.2f} ms/frame"
+                          f"{'' if stable else ' (unstable)'}")
+                    if stable:
+                        results.append((median, speed, chunk))
+
+            if not results:
+                self.spi.max_speed_hz, self.spi_chunk_size = original
+                print("[SPI] Calibration found no stable setting, keeping defaults")
+                return None
+            # Fastest wins; within 3% prefer the lower clock for more signal margin
+            best_time = min(result[0] for result in results)
+            candidates = [result for result in results if result[0] <= best_time * 1.03]
+            frame_time, speed, chunk = min(candidates, key=lambda result: (result[1], result[0]))
+            self.spi.max_speed_hz = speed
+            self.spi_chunk_size = chunk
+            setting = {"max_speed_hz": speed, "chunk_size": chunk, "frame_ms": round(frame_time * 1000, 3)}
+            print(f"[SPI] Calibrated {self.platform_model}: {setting}")
+            if save:
+                self._save_spi_calibration(setting)
+            return setting
 
     def set_window(self, x0, y0, x1, y1, use_horizontal=0):
         if use_horizontal in (0, 1):
@@ -468,8 +880,9 @@ class WhisplayBoard:
     def draw_pixel(self, x, y, color):
         if x >= self.LCD_WIDTH or y >= self.LCD_HEIGHT:
             return
-        self.set_window(x, y, x, y)
-        self._send_data([(color >> 8) & 0xFF, color & 0xFF])
+        with self.spi_lock:
+            self.set_window(x, y, x, y)
+            self._send_data([(color >> 8) & 0xFF, color & 0xFF])
 
     def draw_line(self, x0, y0, x1, y1, color):
         dx = abs(x1 - x0)
@@ -491,22 +904,24 @@ class WhisplayBoard:
                 y0 += sy
 
     def fill_screen(self, color):
-        self.set_window(0, 0, self.LCD_WIDTH - 1, self.LCD_HEIGHT - 1)
         buffer = []
         high = (color >> 8) & 0xFF
         low = color & 0xFF
         for _ in range(self.LCD_WIDTH * self.LCD_HEIGHT):
             buffer.extend([high, low])
-        self._send_data(buffer)
+        with self.spi_lock:
+            self.set_window(0, 0, self.LCD_WIDTH - 1, self.LCD_HEIGHT - 1)
+            self._send_data(buffer)
 
     def draw_image(self, x, y, width, height, pixel_data):
         if (x + width > self.LCD_WIDTH) or (y + height > self.LCD_HEIGHT):
             raise ValueError("Image dimensions exceed screen bounds")
-        self.set_window(x, y, x + width - 1, y + height - 1)
-        self._send_data(pixel_data)
+        with self.spi_lock:
+            self.set_window(x, y, x + width - 1, y + height - 1)
+            self._send_data(pixel_data)
 
     # ========== RGB LED & Button ==========
-    def set_rgb(self, r, g, b):
+    def _apply_rgb(self, r, g, b):
         self.red_pwm.ChangeDutyCycle(100 - (r / 255 * 100))
         self.green_pwm.ChangeDutyCycle(100 - (g / 255 * 100))
         self.blue_pwm.ChangeDutyCycle(100 - (b / 255 * 100))
@@ -514,24 +929,29 @@ class WhisplayBoard:
         self._current_g = g
         self._current_b = b
 
-    def set_rgb_fade(self, r_target, g_target, b_target, duration_ms=100):
-        steps = 20  # Adjust steps to control fade smoothness
-        delay_ms = duration_ms / steps
-
-        r_step = (r_target - self._current_r) / steps
-        g_step = (g_target - self._current_g) / steps
-        b_step = (b_target - self._current_b) / steps
-
-        for _ in range(steps + 1):
-            r_interim = int(self._current_r + _ * r_step)
-            g_interim = int(self._current_g + _ * g_step)
-            b_interim = int(self._current_b + _ * b_step)
-            self.set_rgb(
-                max(0, min(255, r_interim)),
-                max(0, min(255, g_interim)),
-                max(0, min(255, b_interim)),
-            )
-            time.sleep(delay_ms / 1000.0)
+    def set_rgb(self, r, g, b):
+        """Set the colour immediately, cancelling any running LED animation"""
+        self.led.set_color(r, g, b)
+
+    def set_rgb_fade(self, r_target, g_target, b_target, duration_ms=100, easing="ease_in_out"):
+        """Fade to the target colour in the background; returns immediately.
+        A later call retargets from whatever colour is showing at that moment.
+        """
+        self.led.fade(
+            max(0, min(255, int(r_target))),
+            max(0, min(255, int(g_target))),
+            max(0, min(255, int(b_target))),
+            duration_ms,
+            easing,
+        )
+
+    def set_rgb_breathe(self, r, g, b, period_ms=2000, easing="sine", cycles=None):
+        """Pulse between off and the colour until another LED call replaces it"""
+        self.led.breathe(r, g, b, period_ms=period_ms, easing=easing, cycles=cycles)
+
+    def set_rgb_blink(self, r, g, b, on_ms=250, off_ms=250, count=None):
+        """Blink the colour on and off until another LED call replaces it"""
+        self.led.blink(r, g, b, on_ms=on_ms, off_ms=off_ms, count=count)
 
     def button_pressed(self):
         return self._gpio_input(self.BUTTON_PIN) == 1
@@ -542,11 +962,14 @@ class WhisplayBoard:
     def on_button_release(self, callback):
         self.button_release_callback = callback
 
-    def _button_release_event(self, channel):
+    def _button_release_event(self, channel, timestamp=None):
+        # CLOCK_MONOTONIC seconds of the edge, read by callbacks that time gestures
+        self.last_button_event_time = time.monotonic() if timestamp is None else timestamp
         if self.button_release_callback:
             self.button_release_callback()
 
-    def _button_press_event(self, channel):
+    def _button_press_event(self, channel, timestamp=None):
+        self.last_button_event_time = time.monotonic() if timestamp is None else timestamp
         if self.button_press_callback:
             self.button_press_callback()
 
@@ -567,16 +990,21 @@ class WhisplayBoard:
             self.backlight_pwm.stop()
         # Close SPI
         self.spi.close()
-        # Stop RGB LED PWM
+        # Stop LED animations, then RGB LED PWM
+        self.led.stop()
         self.red_pwm.stop()
         self.green_pwm.stop()
         self.blue_pwm.stop()
 
         if self.platform == "rpi":
             GPIO.cleanup()
+        elif self.platform == "emulator":
+            self.emulator.close()
         elif self.platform == "radxa":
             # Stop button listener thread
             self._btn_thread_running = False
+            if hasattr(self, '_btn_wake_w'):
+                os.write(self._btn_wake_w, b"x")
             if hasattr(self, '_btn_thread') and self._btn_thread:
                 self._btn_thread.join(timeout=2)
             # Release GPIO resources
@@ -590,3 +1018,54 @@ class WhisplayBoard:
                     chip.close()
                 except Exception:
                     pass
+
+
+class NullWhisplayBoard(WhisplayBoard):
+    """Stand-in board without any hardware access.
+
+    Accepts every drawing, LED and backlight call and only counts the SPI
+    traffic it would have produced, so the UI process can run off-device
+    for load tests and benchmarks.
+    """
+
+    def __init__(self):
+        self.platform = "null"
+        self.backlight_mode = True
+        self.backlight_pwm = None
+        self._current_r = 0
+        self._current_g = 0
+        self._current_b = 0
+        self.button_press_callback = None
+        self.button_release_callback = None
+        self.last_button_event_time = None
+        self.previous_frame = None
+        self.panel_sleeping = False
+        self.pixel_little_endian = False
+        self.platform_model = "Null"
+        self.spi_chunk_size = None
+        self.spi_lock = threading.RLock()
+        self._reset_spi_stats()
+        self.led = LedAnimator(self._apply_rgb)
+
+    def _gpio_output(self, pin, value):
+        pass
+
+    def _gpio_input(self, pin):
+        return 0
+
+    def _send_command(self, cmd, *args):
+        self._record_spi_transfer(1 + len(args), 0.0)
+
+    def _send_data(self, data):
+        self._record_spi_transfer(len(data), 0.0)
+
+    def set_backlight(self, brightness):
+        pass
+
+    def _apply_rgb(self, r, g, b):
+        self._current_r = r
+        self._current_g = g
+        self._current_b = b
+
+    def cleanup(self):
+        self.led.stop()
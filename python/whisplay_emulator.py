@@ -0,0 +1,248 @@
+"""Headless emulation of the Whisplay HAT for off-device runs.
+
+ST7789Emulator decodes the command/data stream that WhisplayBoard sends over
+SPI (CASET/RASET/RAMWR plus the power commands) into an in-memory RGB565
+framebuffer. EmulatedSpiDev stands in for spidev.SpiDev and models the time
+each transfer would take at the configured max_speed_hz.
+"""
+import mmap
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CMD_SLPIN = 0x10
+CMD_SLPOUT = 0x11
+CMD_DISPOFF = 0x28
+CMD_DISPON = 0x29
+CMD_CASET = 0x2A
+CMD_RASET = 0x2B
+CMD_RAMWR = 0x2C
+CMD_RAMWRC = 0x3C
+CMD_RAMCTRL = 0xB0
+
+
+class ST7789Emulator:
+    """Decodes ST7789 commands into a framebuffer of big-endian RGB565 pixels.
+
+    The controller RAM is 240x320, the visible panel is the `size` area at
+    `offset` inside it (WhisplayBoard.set_window shifts rows by 20).
+    If framebuffer_path is set, the RAM is backed by a memory-mapped file so
+    other processes can watch the frame live.
+    """
+
+    def __init__(self, ram_width=240, ram_height=320, offset=(0, 20), size=(240, 280),
+                 framebuffer_path=None):
+        self.ram_width = ram_width
+        self.ram_height = ram_height
+        self.offset = offset
+        self.size = size
+        ram_bytes = ram_width * ram_height * 2
+        self._framebuffer_file = None
+        if framebuffer_path:
+            self._framebuffer_file = open(framebuffer_path, "w+b")
+            self._framebuffer_file.truncate(ram_bytes)
+            self.ram = mmap.mmap(self._framebuffer_file.fileno(), ram_bytes)
+        else:
+            self.ram = bytearray(ram_bytes)
+        self.dc = 0
+        self.sleeping = True
+        self.display_on = False
+        self.little_endian = False
+        self.ram_writes = 0
+        self.pixels_written = 0
+        self._command = None
+        self._params = bytearray()
+        self._window = (0, 0, ram_width - 1, ram_height - 1)
+        self._cursor_x = 0
+        self._cursor_y = 0
+        self._carry = b""
+
+    def write(self, data):
+        """Feed bytes clocked out on SPI, interpreted according to the DC line"""
+        if self.dc == 0:
+            for byte in bytes(data):
+                self._begin_command(byte)
+        elif self._command in (CMD_RAMWR, CMD_RAMWRC):
+            self._write_pixels(bytes(data))
+        else:
+            self._params += bytes(data)
+            self._apply_params()
+
+    def _begin_command(self, command):
+        self._command = command
+        self._params = bytearray()
+        if command == CMD_RAMWR:
+            self._cursor_x, self._cursor_y = self._window[0], self._window[1]
+            self._carry = b""
+            self.ram_writes += 1
+        elif command == CMD_SLPIN:
+            self.sleeping = True
+        elif command == CMD_SLPOUT:
+            self.sleeping = False
+        elif command == CMD_DISPOFF:
+            self.display_on = False
+        elif command == CMD_DISPON:
+            self.display_on = True
+
+    def _apply_params(self):
+        params = self._params
+        x0, y0, x1, y1 = self._window
+        if self._command == CMD_CASET and len(params) >= 4:
+            x0, x1 = (params[0] << 8) | params[1], (params[2] << 8) | params[3]
+        elif self._command == CMD_RASET and len(params) >= 4:
+            y0, y1 = (params[0] << 8) | params[1], (params[2] << 8) | params[3]
+        elif self._command == CMD_RAMCTRL and len(params) >= 2:
+            # ENDIAN bit of the second RAMCTRL parameter selects little-endian pixels
+            self.little_endian = bool(params[1] & 0x08)
+        self._window = (min(x0, self.ram_width - 1), min(y0, self.ram_height - 1),
+                        min(x1, self.ram_width - 1), min(y1, self.ram_height - 1))
+
+    def _write_pixels(self, data):
+        if self._carry:
+            data = self._carry + data
+            self._carry = b""
+        if len(data) % 2:
+            self._carry = data[-1:]
+            data = data[:-1]
+        if self.little_endian:
+            swapped = bytearray(len(data))
+            swapped[0::2] = data[1::2]
+            swapped[1::2] = data[0::2]
+            data = bytes(swapped)
+        x0, y0, x1, y1 = self._window
+        position = 0
+        total = len(data)
+        while position < total and self._cursor_y <= y1:
+            count = min(x1 - self._cursor_x + 1, (total - position) // 2)
+            start = (self._cursor_y * self.ram_width + self._cursor_x) * 2
+            self.ram[start:start + count * 2] = data[position:position + count * 2]
+            position += count * 2
+            self._cursor_x += count
+            if self._cursor_x > x1:
+                self._cursor_x = x0
+                self._cursor_y += 1
+        self.pixels_written += position // 2
+        if self._cursor_y > y1:
+            # Like the controller, wrap around to the start of the window
+            self._cursor_x, self._cursor_y = x0, y0
+
+    def get_frame(self):
+        """Return the visible area as big-endian RGB565 bytes, row by row"""
+        x, y = self.offset
+        width, height = self.size
+        rows = []
+        for row in range(y, y + height):
+            start = (row * self.ram_width + x) * 2
+            rows.append(bytes(self.ram[start:start + width * 2]))
+        return b"".join(rows)
+
+    def to_image(self):
+        """Return the visible area as a PIL RGB image (needs numpy and Pillow)"""
+        if np is None or Image is None:
+            raise RuntimeError("numpy and Pillow are required to export frames")
+        width, height = self.size
+        pixels = np.frombuffer(self.get_frame(), dtype=">u2").reshape(height, width)
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        rgb[:, :, 0] = ((pixels >> 11) & 0x1F) * 255 // 31
+        rgb[:, :, 1] = ((pixels >> 5) & 0x3F) * 255 // 63
+        rgb[:, :, 2] = (pixels & 0x1F) * 255 // 31
+        return Image.fromarray(rgb, "RGB")
+
+    def dump_png(self, path):
+        self.to_image().save(path, format="PNG")
+        return path
+
+    def close(self):
+        if self._framebuffer_file is not None:
+            self.ram.flush()
+            self.ram.close()
+            self._framebuffer_file.close()
+            self._framebuffer_file = None
+
+
+class EmulatedSpiDev:
+    """spidev.SpiDev stand-in feeding an ST7789Emulator.
+
+    Transfer time is modelled as bits / max_speed_hz. With realtime=True the
+    caller is also delayed by that amount, so render-path timings match a
+    real bus at the same clock rate.
+    """
+
+    def __init__(self, display, realtime=False):
+        self.display = display
+        self.realtime = realtime
+        self.max_speed_hz = 100_000_000
+        self.mode = 0
+        self.modeled_time = 0.0
+        self.bytes_sent = 0
+
+    def open(self, bus, device):
+        pass
+
+    def _transfer(self, data):
+        self.display.write(data)
+        duration = len(data) * 8 / self.max_speed_hz
+        self.modeled_time += duration
+        self.bytes_sent += len(data)
+        if self.realtime:
+            time.sleep(duration)
+
+    def xfer2(self, data):
+        self._transfer(data)
+        return [0] * len(data)
+
+    def writebytes(self, data):
+        self._transfer(data)
+
+    def writebytes2(self, data):
+        self._transfer(data)
+
+    def close(self):
+        pass
+
+
+class EmulatedPWM:
+    """Records the duty cycle instead of driving a pin"""
+
+    def __init__(self, frequency=100):
+        self.frequency = frequency
+        self.duty_cycle = 0.0
+        self.running = False
+
+    def start(self, duty_cycle=0):
+        self.duty_cycle = float(duty_cycle)
+        self.running = True
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = max(0.0, min(100.0, float(duty_cycle)))
+
+    def stop(self):
+        self.running = False
+
+
+if __name__ == "__main__":
+    # Draw a test pattern through the full WhisplayBoard path and save it
+    from whisplay import WhisplayBoard
+
+    output_path = sys.argv[1] if len(sys.argv) > 1 else "whisplay-emulator.png"
+    board = WhisplayBoard(backend="emulator")
+    width, height = board.LCD_WIDTH, board.LCD_HEIGHT
+    bar_colors = [0xF800, 0x07E0, 0x001F, 0xFFFF]
+    bar_width = width // len(bar_colors)
+    for index, color in enumerate(bar_colors):
+        row = bytes([color >> 8, color & 0xFF]) * bar_width
+        board.draw_image(index * bar_width, 0, bar_width, height, row * height)
+    board.emulator.dump_png(output_path)
+    print(f"[Emulator] Wrote {os.path.abspath(output_path)}, "
+          f"modeled SPI time {board.spi.modeled_time * 1000:.1f} ms")
+    board.cleanup()
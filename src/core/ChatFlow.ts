@@ -10,12 +10,13 @@ import { extractEmojis } from "../utils";
 import { StreamResponser } from "./StreamResponsor";
 import { recordingsDir } from "../utils/dir";
 import dotEnv from "dotenv";
-import { WakeWordListener } from "../device/wakeword";
+import { WakeEvent, WakeWordListener } from "../device/wakeword";
 import { WhisplayIMBridgeServer } from "../device/im-bridge";
 import { FlowStateMachine } from "./chat-flow/stateMachine";
 import { flowStates } from "./chat-flow/states";
 import { ChatFlowContext, FlowName } from "./chat-flow/types";
-import { playWakeupChime } from "../device/audio";
+import { playWakeupChime, recordFileFormat } from "../device/audio";
+import { startAudioCaptureService } from "../device/audio-capture";
 
 dotEnv.config();
 
@@ -50,6 +51,7 @@ class ChatFlow implements ChatFlowContext {
   currentExternalEmoji: string = "";
   stateMachine: FlowStateMachine;
   isFromWakeListening: boolean = false;
+  pendingWakeAudioPath: string = "";
 
   constructor(options: { enableCamera?: boolean } = {}) {
     console.log(`[${getCurrentTimeTag()}] ChatBot started.`);
@@ -91,12 +93,16 @@ class ChatFlow implements ChatFlowContext {
     const wakeEnabled = (process.env.WAKE_WORD_ENABLED || "").toLowerCase();
     if (wakeEnabled === "true") {
       this.wakeWordListener = new WakeWordListener();
-      this.wakeWordListener.on("wake", () => {
+      this.wakeWordListener.on("wake", (_line: string, event: WakeEvent) => {
         if (this.currentFlowName === "sleep") {
+          // ASR servers fed with mp3 recordings keep recording themselves
+          this.pendingWakeAudioPath =
+            recordFileFormat === "wav" ? event.audioPath || "" : "";
           this.startWakeSession();
         }
       });
-      this.wakeWordListener.start();
+      // Started once the capture service is up so the listener reads its ring
+      startAudioCaptureService().then(() => this.wakeWordListener?.start());
     }
 
     if (isImMode) {
@@ -143,6 +149,13 @@ class ChatFlow implements ChatFlowContext {
 
   transitionTo = (flowName: FlowName): void => {
     console.log(`[${getCurrentTimeTag()}] switch to:`, flowName);
+    // Wake words only matter while asleep; elsewhere the model would just burn CPU
+    // and could trigger on our own TTS
+    if (flowName === "sleep") {
+      this.wakeWordListener?.resume();
+    } else {
+      this.wakeWordListener?.pause();
+    }
     this.stateMachine.transitionTo(flowName);
   };
 
@@ -186,6 +199,14 @@ class ChatFlow implements ChatFlowContext {
     this.transitionTo("wake_listening");
   };
 
+  waitForWakeAudio = (path: string): Promise<void> => {
+    if (!this.wakeWordListener) return Promise.resolve();
+    return this.wakeWordListener.waitForAudio(
+      path,
+      (this.wakeRecordMaxSec + 5) * 1000,
+    );
+  };
+
   endWakeSession = (): void => {
     this.wakeSessionActive = false;
     this.endAfterAnswer = false;
@@ -96,6 +96,29 @@ export const flowStates: Record<FlowName, FlowStateHandler> = {
       ctx.transitionTo("listening");
     });
     onButtonReleased(noop);
+    if (ctx.pendingWakeAudioPath) {
+      // The wakeword listener is already capturing what was said after the wake word
+      const audioPath = ctx.pendingWakeAudioPath;
+      ctx.pendingWakeAudioPath = "";
+      ctx.currentRecordFilePath = audioPath;
+      display({
+        status: "listening",
+        emoji: "😐",
+        RGB: "#00ff00",
+        text: "Listening...",
+        rag_icon_visible: false,
+      });
+      ctx.waitForWakeAudio(audioPath)
+        .catch((err) => {
+          // The WAV header is kept valid while streaming, use what was captured
+          console.error("Wake word audio handoff ended early:", err);
+        })
+        .then(() => {
+          if (ctx.currentFlowName !== "wake_listening") return;
+          ctx.transitionTo("asr");
+        });
+      return;
+    }
     display({
       status: "detecting",
       emoji: "😐",
@@ -33,11 +33,13 @@ export interface ChatFlowContext {
   pendingExternalEmoji: string;
   currentExternalEmoji: string;
   isFromWakeListening: boolean;
+  pendingWakeAudioPath: string;
 
   transitionTo: (flowName: FlowName) => void;
   recognizeAudio: (path: string, isFromAutoListening?: boolean) => Promise<string>;
   partialThinkingCallback: (partialThinking: string) => void;
   startWakeSession: () => void;
+  waitForWakeAudio: (path: string) => Promise<void>;
   endWakeSession: () => void;
   shouldContinueWakeSession: () => boolean;
   shouldEndAfterAnswer: (text: string) => boolean;
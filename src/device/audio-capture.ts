@@ -0,0 +1,145 @@
+import { EventEmitter } from "events";
+import { spawn, ChildProcess } from "child_process";
+import { resolve } from "path";
+import dotenv from "dotenv";
+dotenv.config();
+
+// One process reads the microphone into a shared-memory ring (python/audio_capture.py);
+// the wake word listener, the recorder and the noise sampler all read from it instead
+// of each opening the ALSA device. Defaults to on when the wake word listener is enabled,
+// since that is when the device would otherwise be opened twice.
+const pythonBinary =
+  process.env.AUDIO_CAPTURE_PYTHON_PATH ||
+  process.env.WAKE_WORD_PYTHON_PATH ||
+  "python3";
+const scriptPath = resolve(__dirname, "../../python/audio_capture.py");
+const alsaInputDevice = process.env.ALSA_INPUT_DEVICE || "default";
+export const audioRingName = process.env.WHISPLAY_AUDIO_RING || "whisplay-audio";
+
+const enabled = (
+  process.env.AUDIO_CAPTURE_SERVICE ||
+  process.env.WAKE_WORD_ENABLED ||
+  ""
+).toLowerCase() === "true";
+
+// A service that has been up is restarted after an unexpected exit, waiting
+// 1 s, 2 s, 4 s ... up to 30 s; after this many failed restarts in a row it is
+// given up and readers open the ALSA device directly again
+const maxRestartAttempts = 5;
+const maxRestartDelayMs = 30000;
+// Running this long counts as recovered, the backoff starts over
+const stableRunMs = 60000;
+
+// "ready" each time the ring is being written, "gave_up" when restarting stops
+export const audioCaptureEvents = new EventEmitter();
+
+let serviceProcess: ChildProcess | null = null;
+let running = false;
+let starting: Promise<boolean> | null = null;
+let supervised = false;
+let stopping = false;
+let restartAttempts = 0;
+let readyAt = 0;
+
+export const isAudioCaptureRunning = (): boolean => running;
+
+// True while a service that was running is being restarted; readers should wait for "ready"
+export const isAudioCaptureRestarting = (): boolean =>
+  supervised && !running && !stopping;
+
+const scheduleRestart = (): void => {
+  if (restartAttempts >= maxRestartAttempts) {
+    console.error(
+      `[Audio] capture service failed ${restartAttempts} restarts, falling back to direct ALSA capture`,
+    );
+    supervised = false;
+    audioCaptureEvents.emit("gave_up");
+    return;
+  }
+  const delayMs = Math.min(1000 * 2 ** restartAttempts, maxRestartDelayMs);
+  restartAttempts++;
+  console.log(`[Audio] restarting capture service in ${delayMs} ms`);
+  setTimeout(() => {
+    if (!stopping) spawnService();
+  }, delayMs);
+};
+
+const spawnService = (): Promise<boolean> => {
+  return new Promise<boolean>((resolvePromise) => {
+    let settled = false;
+    const settle = (value: boolean) => {
+      if (settled) return;
+      settled = true;
+      resolvePromise(value);
+    };
+    const child = spawn(
+      pythonBinary,
+      [scriptPath, "serve", "--device", alsaInputDevice, "--name", audioRingName],
+      { env: process.env, stdio: ["ignore", "pipe", "pipe"] },
+    );
+    serviceProcess = child;
+    let buffer = "";
+    child.stdout?.on("data", (data: Buffer) => {
+      buffer += data.toString();
+      let newlineIndex = buffer.indexOf("\n");
+      while (newlineIndex !== -1) {
+        const line = buffer.slice(0, newlineIndex).trim();
+        buffer = buffer.slice(newlineIndex + 1);
+        if (line === "[Audio] READY") {
+          running = true;
+          supervised = true;
+          readyAt = Date.now();
+          settle(true);
+          audioCaptureEvents.emit("ready");
+        } else if (line) {
+          console.log(line);
+        }
+        newlineIndex = buffer.indexOf("\n");
+      }
+    });
+    child.stderr?.on("data", (data: Buffer) => {
+      const message = data.toString().trim();
+      if (message) console.error(`[Audio] ${message}`);
+    });
+    child.on("error", (err) => {
+      console.error("[Audio] Failed to start capture service:", err);
+      settle(false);
+    });
+    child.on("close", (code) => {
+      console.log(`[Audio] capture service exited with code ${code}`);
+      if (running && Date.now() - readyAt >= stableRunMs) restartAttempts = 0;
+      running = false;
+      serviceProcess = null;
+      settle(false);
+      // A service that never came up is not retried, readers use ALSA directly
+      if (supervised && !stopping) scheduleRestart();
+    });
+    setTimeout(() => settle(running), 10000);
+  });
+};
+
+// Resolves true once the ring is being written, false if the service is disabled or failed
+// (callers then fall back to opening the ALSA device themselves)
+export const startAudioCaptureService = (): Promise<boolean> => {
+  if (!enabled) return Promise.resolve(false);
+  if (!starting) {
+    stopping = false;
+    starting = spawnService();
+  }
+  return starting;
+};
+
+export const stopAudioCaptureService = (): void => {
+  stopping = true;
+  serviceProcess?.kill("SIGTERM");
+};
+
+process.on("exit", stopAudioCaptureService);
+
+// A reader of the running service, e.g. `stream` (raw PCM on stdout) or `level`
+export const spawnRingReader = (command: string, args: string[] = []): ChildProcess => {
+  return spawn(pythonBinary, [scriptPath, command, "--name", audioRingName, ...args], {
+    env: process.env,
+    stdio: ["ignore", "pipe", "pipe"],
+  });
+};
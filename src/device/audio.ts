@@ -3,6 +3,7 @@ import { isEmpty, noop, set } from "lodash";
 import dotenv from "dotenv";
 import { ttsServer, asrServer } from "../cloud-api/server";
 import { ASRServer, TTSResult, TTSServer } from "../type";
+import { isAudioCaptureRunning, spawnRingReader } from "./audio-capture";
 
 export { getDynamicVoiceDetectLevel } from "./voice-detect";
 
@@ -54,6 +55,39 @@ const killAllRecordingProcesses = (): void => {
   recordingProcessList.length = 0;
 };
 
+// sox recording the microphone into outputArgs; while the capture service runs it reads
+// raw PCM from the shared ring instead of opening the ALSA device a second time
+const spawnRecorder = (outputArgs: string[]): ChildProcess => {
+  if (!isAudioCaptureRunning()) {
+    return spawn("sox", ["-t", "alsa", alsaInputDevice, ...outputArgs]);
+  }
+  // A little lookback covers the time it takes to spawn the reader
+  const reader = spawnRingReader("stream", ["--lookback", "0.2"]);
+  const recorder = spawn("sox", [
+    "-t",
+    "raw",
+    "-r",
+    "16000",
+    "-e",
+    "signed-integer",
+    "-b",
+    "16",
+    "-c",
+    "1",
+    "-",
+    ...outputArgs,
+  ]);
+  reader.stdout?.pipe(recorder.stdin!);
+  // sox closes its input when the silence effect ends the recording
+  recorder.stdin?.on("error", noop);
+  reader.stderr?.on("data", (data) => {
+    console.error(data.toString());
+  });
+  recorder.on("exit", () => reader.kill("SIGTERM"));
+  recordingProcessList.push(reader);
+  return recorder;
+};
+
 export const playWakeupChime = (): Promise<void> => {
   return new Promise((resolve) => {
     let finished = false;
@@ -119,9 +153,6 @@ const recordAudio = async (
 ): Promise<string> => {
   return new Promise((resolve, reject) => {
     const args = [
-      "-t",
-      "alsa",
-      alsaInputDevice,
       "-t",
       recordFileFormat,
       "-c",
@@ -139,7 +170,7 @@ const recordAudio = async (
     ];
     console.log(`Starting recording, maximum ${duration} seconds...`);
     currentRecordingReject = reject;
-    const recordingProcess = spawn("sox", args);
+    const recordingProcess = spawnRecorder(args);
 
     recordingProcess.on("error", (err) => {
       killAllRecordingProcesses();
@@ -180,10 +211,7 @@ const recordAudioManually = (
   let stopFunc: () => void = noop;
   const result = new Promise<string>((resolve, reject) => {
     currentRecordingReject = reject;
-    const recordingProcess = spawn("sox", [
-      "-t",
-      "alsa",
-      alsaInputDevice,
+    const recordingProcess = spawnRecorder([
       "-t",
       recordFileFormat,
       "-c",
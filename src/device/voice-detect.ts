@@ -1,4 +1,5 @@
 import { spawn } from "child_process";
+import { isAudioCaptureRunning, spawnRingReader } from "./audio-capture";
 
 const alsaInputDevice = process.env.ALSA_INPUT_DEVICE || "default";
 
@@ -65,7 +66,11 @@ const detectAmbientNoiseLevel = (): Promise<number | null> => {
       `${noiseSampleDurationSec}`,
       "stat",
     ];
-    const sampleProcess = spawn("sox", soxArgs);
+    // The capture service already holds the last seconds of audio; `level` prints the
+    // same "RMS amplitude:" line as sox stat without opening the device
+    const sampleProcess = isAudioCaptureRunning()
+      ? spawnRingReader("level", ["--seconds", `${noiseSampleDurationSec}`])
+      : spawn("sox", soxArgs);
 
     let output = "";
     sampleProcess.stdout?.on("data", (data: Buffer) => {
@@ -1,25 +1,63 @@
 import { EventEmitter } from "events";
 import { spawn, ChildProcess } from "child_process";
 import { resolve } from "path";
+import { noop } from "lodash";
+import {
+  audioCaptureEvents,
+  audioRingName,
+  isAudioCaptureRestarting,
+  isAudioCaptureRunning,
+} from "./audio-capture";
+import { recordFileFormat } from "./audio";
 import dotenv from "dotenv";
 dotenv.config();
 
 const pythonBinary = process.env.WAKE_WORD_PYTHON_PATH || "python3";
+// Restart backoff after an unexpected exit, as for the capture service
+const maxRestartAttempts = 5;
+const maxRestartDelayMs = 30000;
+const stableRunMs = 60000;
+
+export interface WakeEvent {
+  keyword: string;
+  score: number;
+  // WAV file streaming the audio captured after the wake word, if handoff is enabled
+  audioPath?: string;
+}
 
 export class WakeWordListener extends EventEmitter {
   private process: ChildProcess | null = null;
   private buffer: string = "";
+  private finishedAudio: Set<string> = new Set();
+  private paused: boolean = false;
+  private stopped: boolean = false;
+  private startedAt: number = 0;
+  private restartAttempts: number = 0;
 
   start(): void {
     if (this.process) return;
     const enabled = (process.env.WAKE_WORD_ENABLED || "").toLowerCase();
     if (enabled !== "true") return;
+    this.stopped = false;
+    this.startedAt = Date.now();
 
     const scriptPath = resolve(__dirname, "../../python/wakeword.py");
+    const env: NodeJS.ProcessEnv = { ...process.env };
+    // Read the shared capture ring unless a source was configured explicitly
+    if (isAudioCaptureRunning() && !env.WAKE_WORD_AUDIO_SOURCE) {
+      env.WAKE_WORD_AUDIO_SOURCE = `ring:${audioRingName}`;
+    }
+    // Handoff files are WAV; ASR servers fed with mp3 record for themselves
+    if (recordFileFormat !== "wav") env.WAKE_WORD_HANDOFF = "false";
     this.process = spawn(pythonBinary, [scriptPath], {
-      env: process.env,
-      stdio: ["ignore", "pipe", "pipe"],
+      env,
+      stdio: ["pipe", "pipe", "pipe"],
     });
+    this.buffer = "";
+    // The process may exit before reading a command; that is reported by "close"
+    this.process.stdin?.on("error", noop);
+    // A restarted listener keeps the state ChatFlow last asked for
+    if (this.paused) this.sendCommand("PAUSE");
 
     this.process.stdout?.on("data", (data: Buffer) => {
       this.buffer += data.toString();
@@ -27,8 +65,14 @@ export class WakeWordListener extends EventEmitter {
       while (newlineIndex !== -1) {
         const line = this.buffer.slice(0, newlineIndex).trim();
         this.buffer = this.buffer.slice(newlineIndex + 1);
-        if (line.startsWith("WAKE")) {
-          this.emit("wake", line);
+        if (line.startsWith("WAKE_AUDIO_END")) {
+          const [, audioPath] = line.split(/\s+/);
+          this.finishedAudio.add(audioPath);
+          this.emit("audio_end", audioPath);
+        } else if (line.startsWith("WAKE")) {
+          const [, keyword, score, audioPath] = line.split(/\s+/);
+          const event: WakeEvent = { keyword, score: parseFloat(score), audioPath };
+          this.emit("wake", line, event);
         } else if (line) {
           console.log(`[WakeWord] ${line}`);
         }
@@ -46,10 +90,96 @@ export class WakeWordListener extends EventEmitter {
     this.process.on("close", (code) => {
       console.log(`[WakeWord] process exited with code ${code}`);
       this.process = null;
+      this.emit("exit", code);
+      if (!this.stopped) this.scheduleRestart();
+    });
+  }
+
+  private scheduleRestart(): void {
+    if (Date.now() - this.startedAt >= stableRunMs) this.restartAttempts = 0;
+    if (isAudioCaptureRestarting()) {
+      // The ring writer went away; start again once it is back (or ALSA is free)
+      const restart = () => {
+        audioCaptureEvents.off("ready", restart);
+        audioCaptureEvents.off("gave_up", restart);
+        if (!this.stopped) this.start();
+      };
+      audioCaptureEvents.on("ready", restart);
+      audioCaptureEvents.on("gave_up", restart);
+      return;
+    }
+    if (this.restartAttempts >= maxRestartAttempts) {
+      console.error(`[WakeWord] giving up after ${this.restartAttempts} restarts`);
+      return;
+    }
+    const delayMs = Math.min(1000 * 2 ** this.restartAttempts, maxRestartDelayMs);
+    this.restartAttempts++;
+    console.log(`[WakeWord] restarting in ${delayMs} ms`);
+    setTimeout(() => {
+      if (!this.stopped) this.start();
+    }, delayMs);
+  }
+
+  // Stop running the model (audio keeps being drained), e.g. while recording or playing TTS
+  pause(): void {
+    if (this.paused) return;
+    this.paused = true;
+    this.sendCommand("PAUSE");
+  }
+
+  // Continue detection with freshly reset model buffers
+  resume(): void {
+    if (!this.paused) return;
+    this.paused = false;
+    this.sendCommand("RESUME");
+  }
+
+  reset(): void {
+    this.sendCommand("RESET");
+  }
+
+  private sendCommand(command: string): void {
+    if (!this.process?.stdin?.writable) return;
+    this.process.stdin.write(`${command}\n`);
+  }
+
+  // Resolves once the handoff file has been fully written (or after timeoutMs);
+  // rejects if the listener process exits first, the file then ends where it stopped
+  waitForAudio(audioPath: string, timeoutMs: number): Promise<void> {
+    return new Promise((resolve, reject) => {
+      const cleanup = () => {
+        clearTimeout(timer);
+        this.off("audio_end", onEnd);
+        this.off("exit", onExit);
+        this.finishedAudio.delete(audioPath);
+      };
+      const finish = () => {
+        cleanup();
+        resolve();
+      };
+      const onEnd = (path: string) => {
+        if (path === audioPath) finish();
+      };
+      const onExit = (code: number | null) => {
+        cleanup();
+        reject(new Error(`wakeword process exited with code ${code} during handoff`));
+      };
+      const timer = setTimeout(finish, timeoutMs);
+      if (this.finishedAudio.has(audioPath)) {
+        finish();
+        return;
+      }
+      if (!this.process) {
+        onExit(null);
+        return;
+      }
+      this.on("audio_end", onEnd);
+      this.on("exit", onExit);
     });
   }
 
   stop(): void {
+    this.stopped = true;
     if (!this.process) return;
     this.process.kill("SIGTERM");
     this.process = null;